@@ -48,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'registration.instrumentation.PerformanceMiddleware',
+    'registration.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -89,6 +91,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # For several workers on one file: readers and the writer don't block each other (WAL),
+        # commits skip most fsyncs, lock waits last up to `timeout` seconds, and write transactions
+        # take the lock when they begin, where SQLite can still wait for it.
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -137,7 +147,11 @@ AUTH_USER_MODEL = 'registration.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'registration.authentication.ClaimsJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'registration.instrumentation.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
 }
 
@@ -150,6 +164,8 @@ SIMPLE_JWT = {
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_OBTAIN_SERIALIZER': 'registration.api.serializers.CustomTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'registration.api.serializers.FilteredTokenRefreshSerializer',
 }
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -166,12 +182,108 @@ SERVER_EMAIL = 'programmersaphal@gmail.com'
 # Debug email sending during development
 EMAIL_USE_DEBUG = True
 
+# Notification emails are queued in the outbox and sent by `manage.py send_outbox`
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_BASE_SECONDS = 30  # Doubled after every failed attempt
+OUTBOX_RETRY_MAX_SECONDS = 3600
+OUTBOX_LEASE_SECONDS = 300  # How long a claimed batch is hidden from other workers
+
+# Appointment lists are paginated with a cursor over (date, time, id)
+APPOINTMENT_PAGE_SIZE = 50
+APPOINTMENT_MAX_PAGE_SIZE = 200
+# Longest date range served by the doctor availability endpoint
+AVAILABILITY_MAX_DAYS = 62
+# Rows fetched per round trip by the streaming appointment export
+APPOINTMENT_EXPORT_CHUNK_SIZE = 2000
+# Rows per batch of the bulk appointment import
+APPOINTMENT_IMPORT_CHUNK_SIZE = 1000
+
+# Live notification stream (/api/notifications/stream/, needs an ASGI server).
+# Use 'registration.events.UnixSocketBroker' to share events between the workers of one host.
+NOTIFICATION_BROKER = 'registration.events.InProcessBroker'
+NOTIFICATION_BROKER_SOCKET_DIR = BASE_DIR / 'run' / 'notification-events'
+NOTIFICATION_STREAM_HEARTBEAT = 15  # Seconds between keep-alive comments
+NOTIFICATION_STREAM_MAX_PENDING = 100  # Undelivered events kept per connection
+
+# Most doctor profiles returned by a directory search
+DOCTOR_SEARCH_MAX_RESULTS = 100
+
+# Largest number of symptom sets accepted by /api/predict/batch/
+PREDICTION_MAX_BATCH_SIZE = 1000
+
+# Disease prediction model, loaded once per process and reloaded when the file changes
+DISEASE_MODEL_PATH = BASE_DIR / 'registration' / 'randomforest.pkl'
+DISEASE_MODEL_CHECK_INTERVAL = 5  # Seconds between checks of the model file for changes
+DISEASE_MODEL_WARMUP = False  # Load the model at startup instead of on the first prediction
+PREDICTION_CACHE_SIZE = 4096  # Cached symptom combinations per process, 0 disables the cache
+PREDICTION_CACHE_TTL = 3600  # Seconds
+
+# Local memory is per process: with several workers use a shared backend, e.g.
+# 'django.core.cache.backends.filebased.FileBasedCache' with a directory LOCATION,
+# so profile changes invalidate every worker's cache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'clinicsathi',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    }
+}
+DOCTOR_PROFILE_CACHE = 'default'
+DOCTOR_PROFILE_CACHE_TTL = 300  # Seconds; also bounds staleness across per-process caches
+
+# Profile picture variants: square edge in pixels per size, each saved as JPEG and WebP
+PROFILE_PICTURE_SIZES = {'small': 96, 'medium': 320}
+PROFILE_PICTURE_WORKERS = 2  # Background threads rendering variants after uploads
+PROFILE_PICTURE_VARIANTS_ASYNC = True
+
+# Request instrumentation (registration.instrumentation.PerformanceMiddleware)
+PERFORMANCE_SERVER_TIMING = True  # Send the Server-Timing header
+PERFORMANCE_SLOW_REQUEST_MS = 500  # Requests at least this slow are logged...
+PERFORMANCE_SLOW_LOG_SAMPLE_RATE = 1.0  # ...with this probability
+PERFORMANCE_SLOW_REQUEST_QUERIES = 5  # Slowest queries included in the log entry
+
+# Token checks (ClaimsJWTAuthentication): seconds another process may take to notice
+# a password change or deactivation, and users remembered per process
+AUTH_USER_CACHE_TTL = 60
+AUTH_USER_CACHE_MAX_ENTRIES = 10000
+# Seconds between looks for refresh tokens blacklisted by other processes
+TOKEN_BLACKLIST_REFRESH_INTERVAL = 5
+
+# Write views rerun this many times when SQLite still reports the database locked (see retry_on_lock)
+SQLITE_LOCK_RETRIES = 3
+SQLITE_LOCK_RETRY_DELAY = 0.05  # Seconds before the first retry, doubling after each
+
+IDEMPOTENCY_KEY_TTL = 24 * 3600  # Seconds a response is replayed for retries with the same Idempotency-Key
+
 import os
 from dotenv import load_dotenv
 load_dotenv()
 # MY_ENV_VAR = os.getenv('MY_ENV_VAR')
 BASE_URL = os.getenv("BASE_URL")
 
+# Read replicas: DATABASE_REPLICAS=/path/replica1.sqlite3,/path/replica2.sqlite3 (kept in sync outside Django).
+# GET requests read from them, except for clients that wrote in the last REPLICA_PIN_SECONDS.
+DATABASE_REPLICAS = []
+for index, name in enumerate(filter(None, os.getenv('DATABASE_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{index}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name.strip(),
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),  # Replicas are read while being synced
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{index}')
+DATABASE_ROUTERS = ['registration.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_CACHE = 'default'
+if DATABASE_REPLICAS:
+    # Every worker must see the pins, which the per-process 'default' cache cannot do (see check_pin_cache)
+    CACHES['replica-pins'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('REPLICA_PIN_CACHE_DIR', str(BASE_DIR / 'replica-pins')),
+    }
+    REPLICA_PIN_CACHE = 'replica-pins'
+
 
 
 # @csrf_exempt 
@@ -190,6 +302,7 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_HEADERS = list(default_headers) + [
     'Authorization',  # Add this if you need to send JWT tokens in the Authorization header
+    'Idempotency-Key',
 ]
 
 CORS_ALLOW_CREDENTIALS = True
@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from ..models import User, DoctorProfile, PatientProfile, Appointment, Notification
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from django.core.files.storage import default_storage
+from ..images import variants_are_current, variant_sizes
+from ..authentication import add_claims
+from ..blacklist import FilteredRefreshToken
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8, required=True)
@@ -34,7 +38,18 @@ class DoctorProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = DoctorProfile
         fields = ['specialization', 'profile_picture', 'certificate_picture', 'license_number', 'phone', 'clinic_address',
-            'google_map_link']
+            'google_map_link', 'work_start', 'work_end', 'slot_minutes']
+
+    def validate(self, data):
+        # Check the slot grid against the stored values on partial updates
+        work_start = data.get('work_start', getattr(self.instance, 'work_start', None))
+        work_end = data.get('work_end', getattr(self.instance, 'work_end', None))
+        slot_minutes = data.get('slot_minutes', getattr(self.instance, 'slot_minutes', None))
+        if work_start and work_end and work_start >= work_end:
+            raise serializers.ValidationError("Working hours must end after they start.")
+        if slot_minutes is not None and not 5 <= slot_minutes <= 240:
+            raise serializers.ValidationError("Slot length must be between 5 and 240 minutes.")
+        return data
 
 class PatientProfileSerializer(serializers.ModelSerializer):
     class Meta:
@@ -83,6 +98,11 @@ class DoctorRegistrationSerializer(serializers.ModelSerializer):
         return doctor
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # Lets ClaimsJWTAuthentication authenticate requests without loading the user
+        return add_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         data = super().validate(attrs)
         # Add additional user information to the token response
@@ -93,6 +113,10 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         })
         return data
 
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    # Blacklist checked against the in-process filter instead of the database
+    token_class = FilteredRefreshToken
+
 class DoctorSearchSerializer(serializers.ModelSerializer):
     specialization = serializers.CharField(source='doctor_profile.specialization')
 
@@ -146,6 +170,8 @@ class NotificationSerializer(serializers.ModelSerializer):
 class PublicDoctorProfileSerializer(serializers.ModelSerializer):
     user_username = serializers.CharField(source='user.username', read_only=True)
     user_email = serializers.EmailField(source='user.email', read_only=True)
+    profile_thumbnail = serializers.SerializerMethodField()
+    profile_picture_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = DoctorProfile
@@ -154,7 +180,31 @@ class PublicDoctorProfileSerializer(serializers.ModelSerializer):
             'user_email',
             'specialization',
             'profile_picture',
+            'profile_thumbnail',
+            'profile_picture_variants',
             'phone',
             'clinic_address',
             'google_map_link'
-        ]
\ No newline at end of file
+        ]
+
+    def get_profile_picture_variants(self, obj):
+        # {"small": {"jpeg": url, "webp": url}, ...}; empty until the variants of the current picture exist
+        if not variants_are_current(obj):
+            return {}
+        return {
+            size: {image_format: default_storage.url(path) for image_format, path in formats.items()}
+            for size, formats in obj.picture_variants.items()
+            if isinstance(formats, dict)
+        }
+
+    def get_profile_thumbnail(self, obj):
+        # Smallest JPEG variant, or the original picture while it is being processed
+        if variants_are_current(obj):
+            small = min(
+                (name for name, formats in obj.picture_variants.items() if isinstance(formats, dict)),
+                key=lambda name: variant_sizes().get(name, 0),
+                default=None,
+            )
+            if small and 'jpeg' in obj.picture_variants[small]:
+                return default_storage.url(obj.picture_variants[small]['jpeg'])
+        return obj.profile_picture.url if obj.profile_picture else None
\ No newline at end of file
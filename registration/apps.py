@@ -1,6 +1,23 @@
+import logging
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class RegistrationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'registration'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import instrumentation  # noqa: F401  (times queries on every new connection)
+        from . import routers  # noqa: F401  (checks the replica pin cache)
+
+        if getattr(settings, 'DISEASE_MODEL_WARMUP', False):
+            from .model_registry import model_registry, ModelUnavailable
+            try:
+                model_registry.get()
+            except ModelUnavailable:
+                logger.warning("Disease model warm-up failed; it will be loaded on first prediction.", exc_info=True)
@@ -0,0 +1,126 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.crypto import salted_hmac
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+from .routers import primary
+
+# Claims added to every token issued at login (see CustomTokenObtainPairSerializer.get_token)
+USERNAME_CLAIM = 'username'
+ROLE_CLAIM = 'role'
+PASSWORD_CLAIM = 'pwd'
+
+
+def password_marker(password_hash):
+    """
+    Short keyed digest of the user's password hash. It changes whenever the password does,
+    which invalidates the tokens carrying the old one; being keyed, it says nothing about the hash.
+    """
+    return salted_hmac('registration.authentication.password', password_hash).hexdigest()[:16]
+
+
+def add_claims(token, user):
+    token[USERNAME_CLAIM] = user.username
+    token[ROLE_CLAIM] = user.role
+    token[PASSWORD_CLAIM] = password_marker(user.password)
+    return token
+
+
+class UserStateCache:
+    """
+    In-process TTL cache of what a token is checked against: user id -> (is_active, username, role, password marker).
+
+    Entries are dropped when the user is saved or deleted (see signals) and on logout.
+    Other processes notice such a change once their entry expires, so the TTL bounds
+    how long a changed password or a deactivation can go unnoticed there.
+    """
+
+    def __init__(self):
+        self.entries = {}  # user id -> (expires, state), oldest first
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        entry = self.entries.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, user_id, state):
+        expires = time.monotonic() + getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+        with self.lock:
+            self.entries.pop(user_id, None)
+            while len(self.entries) >= getattr(settings, 'AUTH_USER_CACHE_MAX_ENTRIES', 10000):
+                del self.entries[next(iter(self.entries))]
+            self.entries[user_id] = (expires, state)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_states = UserStateCache()
+
+
+def invalidate_user(user_id):
+    # Now, and again after commit so a request running meanwhile cannot re-cache the old state
+    user_states.invalidate(user_id)
+    transaction.on_commit(lambda: user_states.invalidate(user_id))
+
+
+def load_user_state(user_id):
+    state = user_states.get(user_id)
+    if state is None:
+        with primary():  # Cached for the TTL, so it must not be a lagging replica's
+            row = User.objects.filter(pk=user_id).values_list('is_active', 'username', 'role', 'password').first()
+        if row is None:
+            raise AuthenticationFailed("User not found", code='user_not_found')
+        is_active, username, role, password = row
+        state = (is_active, username, role, password_marker(password))
+        user_states.set(user_id, state)
+    return state
+
+
+def claims_user(user_id, username, role):
+    """
+    A `User` backed by the token claims, as if loaded with `.only('id', 'username', 'role', 'is_active')`;
+    any other field is fetched from the database the first time it is read.
+    """
+    values = {'id': user_id, 'username': username, 'role': role, 'is_active': True}
+    # from_db expects the loaded fields in model order
+    field_names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(User.objects.db, field_names, [values[name] for name in field_names])
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds the user from the token claims instead of
+    loading it on every request. The token is still checked against the
+    user's current state (active, same username and role, same password),
+    read from `user_states`, so a warm request costs no query at all.
+
+    Tokens issued without the claims fall back to the usual lookup.
+    """
+
+    def get_user(self, validated_token):
+        if not all(claim in validated_token for claim in (USERNAME_CLAIM, ROLE_CLAIM, PASSWORD_CLAIM)):
+            return super().get_user(validated_token)
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        is_active, username, role, marker = load_user_state(user_id)
+        if not is_active:
+            raise AuthenticationFailed("User is inactive", code='user_inactive')
+        if validated_token[PASSWORD_CLAIM] != marker:
+            raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+        if (validated_token[USERNAME_CLAIM], validated_token[ROLE_CLAIM]) != (username, role):
+            raise AuthenticationFailed("The user's account has changed; log in again.", code='token_outdated')
+        return claims_user(user_id, username, role)
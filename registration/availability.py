@@ -0,0 +1,86 @@
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Appointment
+
+
+class AvailabilityError(ValueError):
+    """
+    Raised for invalid availability query parameters; the message is safe to return to clients.
+    """
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def slot_grid(profile):
+    """
+    Start times of the doctor's daily slots, e.g. 09:00, 09:15, ... for a 15 minute grid.
+    """
+    start, end = _minutes(profile.work_start), _minutes(profile.work_end)
+    step = max(profile.slot_minutes, 1)
+    return [datetime.time(minute // 60, minute % 60) for minute in range(start, end - step + 1, step)]
+
+
+def parse_range(params):
+    """
+    Read `start` and `end` (inclusive, YYYY-MM-DD); defaults to a week from today.
+    """
+    dates = {}
+    for param in ('start', 'end'):
+        value = params.get(param)
+        if value:
+            try:
+                dates[param] = parse_date(value)
+            except ValueError:
+                dates[param] = None
+            if dates[param] is None:
+                raise AvailabilityError(f"'{param}' must be a date in YYYY-MM-DD format.")
+
+    start = dates.get('start') or timezone.localdate()
+    end = dates.get('end') or start + datetime.timedelta(days=6)
+    max_days = getattr(settings, 'AVAILABILITY_MAX_DAYS', 62)
+    if end < start:
+        raise AvailabilityError("'end' must not be before 'start'.")
+    if (end - start).days >= max_days:
+        raise AvailabilityError(f"At most {max_days} days can be requested at once.")
+    return start, end
+
+
+def free_slots(profile, start, end, now=None):
+    """
+    Free slots per day between `start` and `end`, inclusive.
+
+    The booked (date, time) pairs come from one query on the
+    (doctor, date, time) unique index. Each booking is mapped to the grid
+    slot it falls in, so a booking off the grid still blocks its slot.
+    Slots that have already started are left out.
+    """
+    grid = slot_grid(profile)
+    first = _minutes(profile.work_start)
+    step = max(profile.slot_minutes, 1)
+
+    # Canceled bookings keep their row, and with it the unique (doctor, date, time) key
+    booked = {}
+    bookings = Appointment.objects.filter(doctor_id=profile.user_id, date__range=(start, end)).values_list('date', 'time')
+    for date, time in bookings:
+        offset = _minutes(time) - first
+        if offset >= 0:
+            booked.setdefault(date, set()).add(offset // step)
+
+    now = now or timezone.localtime()
+    days = []
+    for day in range((end - start).days + 1):
+        date = start + datetime.timedelta(days=day)
+        if date < now.date():
+            continue
+        taken = booked.get(date, ())
+        slots = [time for index, time in enumerate(grid) if index not in taken]
+        if date == now.date():
+            slots = [time for time in slots if time > now.time()]
+        days.append({'date': date.isoformat(), 'free': [time.isoformat() for time in slots]})
+    return days
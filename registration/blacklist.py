@@ -0,0 +1,125 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+class BlacklistFilter:
+    """
+    In-process set of the JTIs of blacklisted refresh tokens that have not expired yet.
+
+    It is loaded once and then topped up with the rows added since the last
+    look (`id` greater than the highest one seen), at most every
+    TOKEN_BLACKLIST_REFRESH_INTERVAL seconds, so a refresh check is usually
+    a set lookup. Tokens blacklisted by this process are added right away;
+    other processes see them within the interval.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.jtis = {}  # jti -> expiry, epoch seconds
+        self.last_id = 0
+        self.refreshed = None  # monotonic time of the last look at the table
+
+    def refresh(self, force=False):
+        interval = getattr(settings, 'TOKEN_BLACKLIST_REFRESH_INTERVAL', 5)
+        if not force and self.refreshed is not None and time.monotonic() - self.refreshed < interval:
+            return
+        with self.lock:
+            now = timezone.now()
+            # Rows are committed in id order on SQLite, so none can appear below last_id later
+            rows = BlacklistedToken.objects.filter(id__gt=self.last_id, token__expires_at__gt=now) \
+                .order_by('id').values_list('id', 'token__jti', 'token__expires_at')
+            for row_id, jti, expires_at in rows:
+                self.jtis[jti] = expires_at.timestamp()
+                self.last_id = row_id
+            # Expired tokens fail verification anyway
+            cutoff = now.timestamp()
+            for jti in [jti for jti, expires in self.jtis.items() if expires <= cutoff]:
+                del self.jtis[jti]
+            self.refreshed = time.monotonic()
+
+    def add(self, jti, expires):
+        with self.lock:
+            self.jtis[jti] = expires
+
+    def __contains__(self, jti):
+        self.refresh()
+        return jti in self.jtis
+
+    def __len__(self):
+        return len(self.jtis)
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class FilteredRefreshToken(RefreshToken):
+    """
+    Refresh token whose blacklist check goes through `blacklist_filter` instead of a query.
+    """
+
+    def check_blacklist(self):
+        if self.payload[api_settings.JTI_CLAIM] in blacklist_filter:
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        jti, expires = self.payload[api_settings.JTI_CLAIM], self.payload['exp']
+        transaction.on_commit(lambda: blacklist_filter.add(jti, expires))
+        return result
+
+
+def token_table_sizes(cutoff=None):
+    """
+    Row counts of the token tables, and how many outstanding tokens expired before `cutoff`.
+    """
+    sizes = {
+        'outstanding': OutstandingToken.objects.count(),
+        'blacklisted': BlacklistedToken.objects.count(),
+    }
+    if cutoff is not None:
+        sizes['expired'] = OutstandingToken.objects.filter(expires_at__lt=cutoff).count()
+    return sizes
+
+
+def prune_expired_tokens(cutoff, chunk_size=1000, pause=0, progress=None):
+    """
+    Delete the outstanding tokens (and their blacklist entries) that expired before `cutoff`.
+
+    Rows go in chunks of `chunk_size`, each in its own short transaction,
+    walking the primary key so that no chunk rescans what was deleted.
+    `pause` seconds between chunks leave room for other writers.
+    """
+    stats = {'outstanding': 0, 'blacklisted': 0, 'chunks': 0, 'longest_chunk': 0.0}
+    last_id = 0
+    while True:
+        started = time.perf_counter()
+        with transaction.atomic():
+            ids = list(
+                OutstandingToken.objects.filter(id__gt=last_id, expires_at__lt=cutoff)
+                .order_by('id').values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            _, deleted = OutstandingToken.objects.filter(id__in=ids).delete()
+        stats['longest_chunk'] = max(stats['longest_chunk'], time.perf_counter() - started)
+        stats['outstanding'] += deleted.get(OutstandingToken._meta.label, 0)
+        stats['blacklisted'] += deleted.get(BlacklistedToken._meta.label, 0)
+        stats['chunks'] += 1
+        last_id = ids[-1]
+        if progress:
+            progress(stats)
+        if pause:
+            time.sleep(pause)
+    return stats
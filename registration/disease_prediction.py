@@ -1,11 +1,15 @@
 import json
 from django.http import JsonResponse
-import joblib
 import numpy as np
+from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Load the model once
-model = joblib.load(r"registration\randomforest.pkl")
+from .model_registry import model_registry, ModelUnavailable
+from .prediction_cache import prediction_cache
+from .instrumentation import timed_section
+from .permissions import IsAdmin
 
 # Load any additional data, like dictionaries for symptoms and diseases
 symptoms_dict = {'itching': 0, 'skin_rash': 1, 'nodal_skin_eruptions': 2, 'continuous_sneezing': 3, 'shivering': 4, 'chills': 5, 
@@ -47,6 +51,80 @@ diseases_list = {15: 'Fungal infection', 4: 'Allergy', 16: 'GERD', 9: 'Chronic c
                 25: 'Hypoglycemia', 31: 'Osteoarthristis', 5: 'Arthritis', 0: '(vertigo) Paroymsal  Positional Vertigo', 2: 'Acne', 
                 38: 'Urinary tract infection', 35: 'Psoriasis', 27: 'Impetigo'}
 
+# Symptom sets are encoded as integer bitmasks (bit i set = symptom i present)
+MASK_BYTES = (len(symptoms_dict) + 7) // 8
+
+
+def encode_symptoms(symptoms):
+    """
+    Canonical bitmask for a symptom list; order, duplicates and unknown symptoms don't matter.
+    """
+    mask = 0
+    for symptom in symptoms:
+        column = symptoms_dict.get(symptom)
+        if column is not None:
+            mask |= 1 << column
+    return mask
+
+
+def masks_to_matrix(masks):
+    """
+    Unpack N symptom bitmasks into one (N x 132) 0/1 feature matrix.
+    """
+    raw = b''.join(mask.to_bytes(MASK_BYTES, 'little') for mask in masks)
+    packed = np.frombuffer(raw, dtype=np.uint8).reshape(len(masks), MASK_BYTES)
+    bits = np.unpackbits(packed, axis=1, bitorder='little')[:, :len(symptoms_dict)]
+    return bits.astype(np.float64)
+
+
+def run_model(model, masks):
+    """
+    Predict the given symptom bitmasks with a single model call.
+    """
+    matrix = masks_to_matrix(masks)
+    if hasattr(model, 'predict_proba'):
+        probabilities = model.predict_proba(matrix)
+        best = probabilities.argmax(axis=1)
+        predictions = model.classes_[best]
+        confidences = probabilities[np.arange(len(best)), best]
+    else:
+        predictions = model.predict(matrix)
+        confidences = [None] * len(predictions)
+
+    return [
+        {
+            'predicted_disease': diseases_list.get(prediction, "Unknown Disease"),
+            'confidence': None if confidence is None else round(float(confidence), 4),
+        }
+        for prediction, confidence in zip(predictions, confidences)
+    ]
+
+
+def predict_batch(symptom_lists, loaded_model):
+    """
+    Predict diseases for many symptom lists.
+
+    Repeated symptom sets are answered from the prediction cache; the rest
+    are deduplicated and sent to the model in one call. Returns one
+    `{'predicted_disease', 'confidence'}` dict per input, in order.
+    """
+    if not symptom_lists:
+        return []
+
+    masks = [encode_symptoms(symptoms) for symptoms in symptom_lists]
+    unique_masks = list(dict.fromkeys(masks))
+    results = prediction_cache.get_many(unique_masks, loaded_model.version)
+
+    missing = [mask for mask in unique_masks if mask not in results]
+    if missing:
+        with timed_section('prediction'):
+            computed = dict(zip(missing, run_model(loaded_model.model, missing)))
+        prediction_cache.set_many(computed, loaded_model.version)
+        results.update(computed)
+
+    return [dict(results[mask]) for mask in masks]
+
+
 @csrf_exempt  # Allow POST requests without CSRF token for testing
 def predict_disease(request):
     if request.method == 'POST':
@@ -54,18 +132,57 @@ def predict_disease(request):
             # Parse JSON input
             data = json.loads(request.body)
             user_symptoms = data.get('symptoms', [])
-            
-            # Create input vector
-            input_vector = np.zeros(len(symptoms_dict))
-            for symptom in user_symptoms:
-                if symptom in symptoms_dict:
-                    input_vector[symptoms_dict[symptom]] = 1
 
             # Make prediction
-            prediction = model.predict([input_vector])[0]
-            predicted_disease = diseases_list.get(prediction, "Unknown Disease")
-
-            return JsonResponse({'predicted_disease': predicted_disease})
+            loaded_model = model_registry.get()
+            result = predict_batch([user_symptoms], loaded_model)[0]
+            return JsonResponse({'predicted_disease': result['predicted_disease'], 'model': loaded_model.info()})
+        except ModelUnavailable as e:
+            return JsonResponse({'error': str(e)}, status=503)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
     return JsonResponse({'message': 'Use POST to send symptoms'}, status=405)
+
+
+@csrf_exempt
+def predict_disease_batch(request):
+    """
+    Predict diseases for a list of symptom lists, e.g.
+    {"symptom_sets": [["itching", "skin_rash"], ["cough", "high_fever"]]}.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'message': 'Use POST to send symptom sets'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON body.'}, status=400)
+
+    symptom_sets = data.get('symptom_sets') if isinstance(data, dict) else None
+    if not isinstance(symptom_sets, list) or not all(isinstance(symptoms, list) for symptoms in symptom_sets):
+        return JsonResponse({'error': "'symptom_sets' must be a list of symptom lists."}, status=400)
+
+    max_batch_size = getattr(settings, 'PREDICTION_MAX_BATCH_SIZE', 1000)
+    if len(symptom_sets) > max_batch_size:
+        return JsonResponse(
+            {'error': f"At most {max_batch_size} symptom sets can be sent per request."}, status=400
+        )
+
+    try:
+        loaded_model = model_registry.get()
+        predictions = predict_batch(symptom_sets, loaded_model)
+    except ModelUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=503)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'predictions': predictions, 'model': loaded_model.info()})
+
+
+class PredictionCacheStatsView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        """
+        Hit/miss/eviction counters of this process's prediction cache (admins only).
+        """
+        return Response(prediction_cache.stats())
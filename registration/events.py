@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    One connected client: an asyncio queue bound to the event loop it waits on.
+    """
+
+    def __init__(self, user_id, loop, max_pending):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_pending)
+
+    def deliver(self, payload):
+        # Runs on the subscriber's loop; a client that stopped reading loses its oldest events
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(payload)
+
+
+class InProcessBroker:
+    """
+    Fans notifications out to the clients connected to this process.
+
+    Idle subscribers cost an entry in a dict and nothing else: no polling,
+    no database access.
+    """
+
+    def __init__(self):
+        self._subscribers = {}  # user_id -> set of Subscription
+        self._lock = threading.Lock()
+
+    @property
+    def max_pending(self):
+        return getattr(settings, 'NOTIFICATION_STREAM_MAX_PENDING', 100)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, asyncio.get_running_loop(), self.max_pending)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id, payload):
+        """
+        Deliver an event to the user's clients. Safe to call from any thread.
+        """
+        self.dispatch(user_id, payload)
+
+    def dispatch(self, user_id, payload):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, payload)
+            except RuntimeError:
+                # The subscriber's loop has been closed
+                self.unsubscribe(subscription)
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+
+class UnixSocketBroker(InProcessBroker):
+    """
+    Shares events between the worker processes of one host.
+
+    Every process binds a Unix datagram socket in a shared directory and
+    a listener thread dispatches what it receives to the local clients.
+    Publishing sends the event to every socket in the directory, so all
+    workers see all events. It stands in for a network pub/sub (e.g. Redis)
+    on single-host deployments.
+    """
+
+    def __init__(self, socket_dir=None):
+        super().__init__()
+        self._socket_dir = socket_dir
+        self._socket = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def socket_dir(self):
+        return Path(
+            self._socket_dir
+            or getattr(settings, 'NOTIFICATION_BROKER_SOCKET_DIR', None)
+            or Path(settings.BASE_DIR) / 'run' / 'notification-events'
+        )
+
+    def subscribe(self, user_id):
+        self._start_listener()
+        return super().subscribe(user_id)
+
+    def _start_listener(self):
+        with self._start_lock:
+            if self._socket is not None:
+                return
+            self.socket_dir.mkdir(parents=True, exist_ok=True)
+            path = self.socket_dir / f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock"
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            listener.bind(str(path))
+            self._socket = listener
+            threading.Thread(target=self._listen, args=(listener,), daemon=True, name='notification-events').start()
+
+    def _listen(self, listener):
+        while True:
+            try:
+                data = listener.recv(65536)
+                message = json.loads(data)
+                self.dispatch(message['user_id'], message['payload'])
+            except Exception:
+                logger.exception("Dropping malformed notification event")
+
+    def publish(self, user_id, payload):
+        data = json.dumps({'user_id': user_id, 'payload': payload}, default=str).encode()
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            for path in self.socket_dir.glob('*.sock'):
+                try:
+                    sender.sendto(data, str(path))
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Left behind by a worker that is gone
+                    path.unlink(missing_ok=True)
+                except OSError:
+                    logger.exception("Could not deliver notification event to %s", path)
+        finally:
+            sender.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'NOTIFICATION_BROKER', 'registration.events.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def notification_payload(notification):
+    return {
+        'id': notification.id,
+        'event_type': notification.event_type,
+        'subject': notification.subject,
+        'message': notification.message,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.isoformat(),
+    }
@@ -0,0 +1,77 @@
+import csv
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Column name -> values() lookup; the joins are resolved by the export query itself
+EXPORT_FIELDS = {
+    'id': 'id',
+    'token': 'token',
+    'date': 'date',
+    'time': 'time',
+    'status': 'status',
+    'doctor': 'doctor__username',
+    'patient': 'patient__username',
+    'patient_email': 'patient__email',
+    'reason': 'reason',
+    'prescription': 'prescription',
+    'created_at': 'created_at',
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """
+    File-like object whose write() hands the line back instead of storing it.
+    """
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset):
+    """
+    Yield one tuple per appointment, fetched in chunks from a single query.
+    """
+    chunk_size = getattr(settings, 'APPOINTMENT_EXPORT_CHUNK_SIZE', 2000)
+    return queryset.values_list(*EXPORT_FIELDS.values()).iterator(chunk_size=chunk_size)
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS.keys())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(rows):
+    columns = list(EXPORT_FIELDS)
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + '\n'
+
+
+def buffered(lines, size=64 * 1024):
+    # One write per ~64 KB instead of one per row
+    buffer, length = [], 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_export(queryset, output):
+    """
+    Body of an export response. Memory use is bounded by the fetch chunk
+    and the write buffer, whatever the number of rows.
+    """
+    rows = export_rows(queryset)
+    return buffered(stream_csv(rows) if output == 'csv' else stream_ndjson(rows))
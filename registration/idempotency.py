@@ -0,0 +1,113 @@
+import datetime
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+class FingerprintEncoder(DjangoJSONEncoder):
+    """
+    Encodes uploaded files by name, size and content hash, anything else unknown as its string.
+    """
+
+    def default(self, o):
+        if isinstance(o, UploadedFile):
+            digest = hashlib.sha256()
+            for chunk in o.chunks():
+                digest.update(chunk)
+            o.seek(0)  # Left for the view to read
+            return {'name': o.name, 'size': o.size, 'sha256': digest.hexdigest()}
+        try:
+            return super().default(o)
+        except TypeError:
+            return str(o)
+
+
+def fingerprint(request):
+    # Same key with another payload is a client bug, not a retry
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())  # Form data: every value of repeated fields
+    payload = json.dumps(data, sort_keys=True, cls=FingerprintEncoder)
+    return hashlib.sha256(f'{request.method} {request.path}\n{payload}'.encode()).hexdigest()
+
+
+def claim(user, key, digest):
+    """
+    Return the user's record for `key` and whether this request claimed it.
+
+    Must run inside the request's transaction. The insert waits for a
+    concurrent request holding the same key to commit (SQLite: the write
+    lock, other databases: the unique index) and then finds its record.
+    """
+    expires_at = timezone.now() + datetime.timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 3600))
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(user=user, key=key, fingerprint=digest, expires_at=expires_at), True
+    except IntegrityError:
+        record = IdempotencyKey.objects.select_for_update().get(user=user, key=key)
+    if record.expires_at <= timezone.now():
+        # Expired: the key is free again
+        record.fingerprint, record.expires_at = digest, expires_at
+        record.response_status = record.response_data = None
+        record.save()
+        return record, True
+    return record, False
+
+
+def replay(record):
+    response = Response(record.response_data, status=record.response_status)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(view_method):
+    """
+    Let clients retry a state-changing view method safely by sending an `Idempotency-Key` header.
+
+    The first response is stored for IDEMPOTENCY_KEY_TTL seconds and replayed for retries
+    with the same key, without running the method again. The key is claimed in the same
+    transaction as the method's writes, so a duplicate sent while the first request is
+    running waits for it; a request that fails with an exception or a 5xx leaves the key free.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+        if not key or len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            return Response({"error": "Idempotency-Key must be 1 to 255 characters long."}, status=status.HTTP_400_BAD_REQUEST)
+
+        digest = fingerprint(request)
+        with transaction.atomic():
+            record, claimed = claim(request.user, key, digest)
+            if not claimed:
+                if record.fingerprint != digest:
+                    return Response(
+                        {"error": "This Idempotency-Key was already used for a different request."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    )
+                return replay(record)
+
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code >= 500:
+                record.delete()
+            else:
+                record.response_status, record.response_data = response.status_code, response.data
+                record.save(update_fields=['response_status', 'response_data'])
+            return response
+
+    return wrapper
@@ -0,0 +1,135 @@
+import io
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from PIL import Image, ImageOps
+
+from .models import DoctorProfile
+from . import profile_cache
+
+logger = logging.getLogger(__name__)
+
+# Pillow format name and file extension per output format
+FORMATS = {'jpeg': ('JPEG', 'jpg'), 'webp': ('WEBP', 'webp')}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def variant_sizes():
+    # Square edge in pixels per variant name
+    return _setting('PROFILE_PICTURE_SIZES', {'small': 96, 'medium': 320})
+
+
+def variants_are_current(profile):
+    variants = profile.picture_variants or {}
+    return bool(profile.profile_picture) and variants.get('source') == profile.profile_picture.name
+
+
+def variant_name(source, profile_id, size_name, extension):
+    stem = posixpath.splitext(posixpath.basename(source))[0]
+    return f"doctor_profiles/variants/{profile_id}/{stem}-{size_name}.{extension}"
+
+
+def render_variants(image_file, sizes):
+    """
+    Yield `(size_name, format, bytes)` for every size and output format.
+
+    The source is decoded once, at reduced scale where the format allows it.
+    """
+    with Image.open(image_file) as image:
+        # JPEG can decode straight to a fraction of its size, far cheaper than a full decode
+        largest = max(sizes.values())
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        for size_name, edge in sizes.items():
+            thumbnail = ImageOps.fit(image, (edge, edge), Image.LANCZOS)
+            for format_key, (pil_format, _) in FORMATS.items():
+                output = io.BytesIO()
+                if pil_format == 'JPEG':
+                    thumbnail.convert('RGB').save(output, pil_format, quality=85, optimize=True, progressive=True)
+                else:
+                    thumbnail.save(output, pil_format, quality=80, method=4)
+                yield size_name, format_key, output.getvalue()
+
+
+def generate_variants(profile_id, force=False):
+    """
+    Create the resized copies of a doctor's profile picture and record them.
+
+    Returns False when there was nothing to do. Files of the previous
+    picture are removed once the new ones are recorded.
+    """
+    profile = DoctorProfile.objects.filter(id=profile_id).only('id', 'profile_picture', 'picture_variants').first()
+    if profile is None or not profile.profile_picture:
+        return False
+    if not force and variants_are_current(profile):
+        return False
+
+    source = profile.profile_picture.name
+    variants = {'source': source}
+    with profile.profile_picture.open('rb') as image_file:
+        for size_name, format_key, data in render_variants(image_file, variant_sizes()):
+            name = variant_name(source, profile.id, size_name, FORMATS[format_key][1])
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            variants.setdefault(size_name, {})[format_key] = default_storage.save(name, ContentFile(data))
+
+    # Only record the variants if the picture was not replaced while they were rendered
+    updated = DoctorProfile.objects.filter(id=profile.id, profile_picture=source).update(picture_variants=variants)
+    if not updated:
+        return False
+
+    current = {path for size in variants.values() if isinstance(size, dict) for path in size.values()}
+    for size in (profile.picture_variants or {}).values():
+        if isinstance(size, dict):
+            for path in set(size.values()) - current:
+                default_storage.delete(path)
+
+    # The update skipped the save signals; cached public profiles still list the old URLs
+    profile_cache.invalidate()
+    return True
+
+
+class VariantWorker:
+    """
+    Renders variants on a small thread pool so uploads return right away.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, profile_id):
+        if not _setting('PROFILE_PICTURE_VARIANTS_ASYNC', True):
+            self.run(profile_id)
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=_setting('PROFILE_PICTURE_WORKERS', 2), thread_name_prefix='picture-variants'
+                )
+        self._executor.submit(self.run, profile_id)
+
+    def run(self, profile_id):
+        try:
+            generate_variants(profile_id)
+        except Exception:
+            # The originals are still served; the backfill command retries
+            logger.exception("Could not create picture variants for doctor profile %s", profile_id)
+        finally:
+            if _setting('PROFILE_PICTURE_VARIANTS_ASYNC', True):
+                connection.close()
+
+
+variant_worker = VariantWorker()
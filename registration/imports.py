@@ -0,0 +1,207 @@
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_time
+
+from .models import User, Appointment, AppointmentTokenCounter
+
+IMPORT_COLUMNS = ('doctor', 'patient', 'date', 'time', 'status', 'reason', 'prescription')
+FORMATS = ('csv', 'ndjson')
+
+
+class RowError(ValueError):
+    """
+    A row that cannot be imported; the message goes into the rejection report.
+    """
+
+
+class ImportResult:
+    """
+    Counts and rejected rows of one import run.
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.rejected = []  # {'line', 'reason', 'row'}
+
+    def reject(self, line, reason, row):
+        self.rejected.append({'line': line, 'reason': reason, 'row': row})
+
+    def as_dict(self, max_rejections=None):
+        return {
+            'created': self.created,
+            'rejected': len(self.rejected),
+            'rejections': self.rejected[:max_rejections],
+        }
+
+
+def format_for(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return {'csv': 'csv', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}.get(extension)
+
+
+def read_rows(lines, file_format):
+    """
+    Yield `(line_number, row)` pairs from CSV or NDJSON text lines.
+
+    Lines that cannot be parsed come back as a row of None.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def clean_row(row):
+    """
+    Validate the fields of one row; returns the cleaned values or raises RowError.
+    """
+    if row is None:
+        raise RowError("Malformed line.")
+    values = {column: (str(row.get(column) or '')).strip() for column in IMPORT_COLUMNS}
+    for column in ('doctor', 'patient', 'date', 'time'):
+        if not values[column]:
+            raise RowError(f"Missing '{column}'.")
+    try:
+        values['date'] = parse_date(values['date'])
+        values['time'] = parse_time(values['time'])
+    except ValueError:
+        values['date'] = values['time'] = None
+    if values['date'] is None or values['time'] is None:
+        raise RowError("Invalid date or time.")
+    values['status'] = values['status'] or 'pending'
+    if values['status'] not in dict(Appointment.STATUS_CHOICES):
+        raise RowError(f"Invalid status '{values['status']}'.")
+    return values
+
+
+class AppointmentImporter:
+    """
+    Imports appointments in chunks with a fixed number of queries per chunk:
+    one user lookup, one conflict check (per 499 doctor days on SQLite),
+    three for the token counters and one bulk insert.
+    """
+
+    def __init__(self, chunk_size=None):
+        self.chunk_size = chunk_size or getattr(settings, 'APPOINTMENT_IMPORT_CHUNK_SIZE', 1000)
+        self.users = {}  # username -> (id, role), or None for unknown usernames
+        self.seen = set()  # (doctor_id, date, time) already imported in this run
+        self.result = ImportResult()
+
+    def run(self, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                return self.result
+            self.import_chunk(chunk)
+
+    def resolve_users(self, usernames):
+        missing = usernames - self.users.keys()
+        if missing:
+            found = {
+                username: (user_id, role)
+                for username, user_id, role in User.objects.filter(username__in=missing).values_list('username', 'id', 'role')
+            }
+            for username in missing:
+                self.users[username] = found.get(username)
+
+    def import_chunk(self, chunk):
+        cleaned = []
+        for line, row in chunk:
+            try:
+                cleaned.append((line, row, clean_row(row)))
+            except RowError as e:
+                self.result.reject(line, str(e), row)
+
+        self.resolve_users({values[role] for _, _, values in cleaned for role in ('doctor', 'patient')})
+        candidates = []
+        for line, row, values in cleaned:
+            doctor, patient = self.users.get(values['doctor']), self.users.get(values['patient'])
+            if doctor is None or doctor[1] != 'doctor':
+                self.result.reject(line, f"Unknown doctor '{values['doctor']}'.", row)
+            elif patient is None or patient[1] != 'patient':
+                self.result.reject(line, f"Unknown patient '{values['patient']}'.", row)
+            else:
+                candidates.append((line, row, doctor[0], patient[0], values))
+        if not candidates:
+            return
+
+        with transaction.atomic():
+            counters = self.lock_counters({(doctor_id, values['date']) for _, _, doctor_id, _, values in candidates})
+            existing = self.existing_slots(candidates)
+
+            appointments = []
+            for line, row, doctor_id, patient_id, values in sorted(candidates, key=lambda c: (c[4]['date'], c[4]['time'])):
+                slot = (doctor_id, values['date'], values['time'])
+                if slot in existing or slot in self.seen:
+                    self.result.reject(line, "This time slot is already booked.", row)
+                    continue
+                self.seen.add(slot)
+                # Tokens follow the order of the day, continuing from the counter
+                counter = counters[(doctor_id, values['date'])]
+                counter.last_token += 1
+                appointments.append(Appointment(
+                    doctor_id=doctor_id, patient_id=patient_id, date=values['date'], time=values['time'],
+                    status=values['status'], reason=values['reason'] or None,
+                    prescription=values['prescription'] or None, token=counter.last_token,
+                ))
+
+            Appointment.objects.bulk_create(appointments)
+            AppointmentTokenCounter.objects.bulk_update(counters.values(), ['last_token'])
+        self.result.created += len(appointments)
+
+    def lock_counters(self, keys):
+        """
+        Fetch, creating where needed, the token counters of the chunk's days, locked until commit.
+        """
+        AppointmentTokenCounter.objects.bulk_create(
+            [AppointmentTokenCounter(doctor_id=doctor_id, date=date) for doctor_id, date in keys],
+            ignore_conflicts=True,
+        )
+        doctor_ids = {doctor_id for doctor_id, _ in keys}
+        dates = {date for _, date in keys}
+        counters = AppointmentTokenCounter.objects.select_for_update().filter(doctor_id__in=doctor_ids, date__in=dates)
+        return {
+            (counter.doctor_id, counter.date): counter
+            for counter in counters
+            if (counter.doctor_id, counter.date) in keys
+        }
+
+    def existing_slots(self, candidates):
+        """
+        Booked (doctor, date, time) slots on exactly the chunk's doctor days,
+        in as few queries as the database's parameter limit allows.
+        """
+        # Run with the counters locked, so bookings of these days cannot slip in before the insert
+        keys = sorted({(doctor_id, values['date']) for _, _, doctor_id, _, values in candidates})
+        max_params = connection.features.max_query_params
+        batch_size = max_params // 2 if max_params else len(keys)
+        existing = set()
+        for start in range(0, len(keys), batch_size):
+            days = Q()
+            for doctor_id, date in keys[start:start + batch_size]:
+                days |= Q(doctor_id=doctor_id, date=date)
+            existing.update(Appointment.objects.filter(days).values_list('doctor_id', 'date', 'time'))
+        return existing
+
+
+def import_appointments(lines, file_format, chunk_size=None):
+    """
+    Import appointments from CSV or NDJSON text lines; returns an ImportResult.
+    """
+    return AppointmentImporter(chunk_size).run(read_rows(lines, file_format))
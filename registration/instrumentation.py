@@ -0,0 +1,158 @@
+import heapq
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger('registration.performance')
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class RequestMetrics:
+    """
+    Query count, database time and named section timings of one request.
+    """
+
+    def __init__(self, keep_queries):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.sections = {}
+        self.keep_queries = keep_queries
+        self.slowest = []  # min-heap of (duration, sequence, sql)
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        if self.keep_queries:
+            entry = (duration, self.queries, sql)
+            if len(self.slowest) < self.keep_queries:
+                heapq.heappush(self.slowest, entry)
+            elif duration > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def add(self, name, duration):
+        self.sections[name] = self.sections.get(name, 0.0) + duration
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total):
+        entries = [f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"']
+        entries += [f'{name};dur={duration * 1000:.1f}' for name, duration in self.sections.items()]
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+@contextmanager
+def timed_section(name):
+    """
+    Add the wall time of the block (including any queries it runs) to the current request's `name` section.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - started)
+
+
+def time_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - started)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    # Installed once per connection object; it stays through reconnects
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+connection_created.connect(install_query_timer)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed_section('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class PerformanceMiddleware:
+    """
+    Times every request and reports it in a `Server-Timing` header:
+    database time and query count, named sections (see `timed_section`)
+    and the total. Slow requests are logged, with their slowest queries,
+    for a sample of them.
+
+    The per-query cost is one context variable lookup and two clock reads;
+    query texts are only kept for the few slowest queries.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(None, connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics, token = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def start(self):
+        metrics = RequestMetrics(_setting('PERFORMANCE_SLOW_REQUEST_QUERIES', 5))
+        return metrics, _current.set(metrics)
+
+    def finish(self, request, response, metrics):
+        total = metrics.elapsed()
+        if _setting('PERFORMANCE_SERVER_TIMING', True):
+            response['Server-Timing'] = metrics.server_timing(total)
+
+        if total * 1000 >= _setting('PERFORMANCE_SLOW_REQUEST_MS', 500) and \
+                random.random() < _setting('PERFORMANCE_SLOW_LOG_SAMPLE_RATE', 1.0):
+            slowest = sorted(metrics.slowest, reverse=True)
+            logger.warning(
+                "Slow request %s %s: %d in %.0f ms, %d queries in %.0f ms, sections %s; slowest queries:%s",
+                request.method, request.path, response.status_code, total * 1000,
+                metrics.queries, metrics.db_time * 1000,
+                {name: round(duration * 1000, 1) for name, duration in metrics.sections.items()},
+                ''.join(f"\n  {duration * 1000:.1f} ms: {sql}" for duration, _, sql in slowest),
+            )
+        return response
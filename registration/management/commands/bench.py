@@ -0,0 +1,233 @@
+import datetime
+import json
+import platform
+import random
+import statistics
+import time
+
+import django
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from registration.api.serializers import CustomTokenObtainPairSerializer
+from registration.disease_prediction import symptoms_dict
+from registration.models import User
+from registration.seeding import SEED_PASSWORD, SYLLABLES, Seeder
+
+SEARCH_TERMS = SYLLABLES[:10] + ['cardio', 'neuro', 'pedia', 'kathmandu']
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the hot API endpoints through the test client on a reproducible dataset. "
+        "Everything runs in a transaction that is rolled back afterwards."
+    )
+    scenarios = (
+        'login', 'book', 'doctor_search', 'doctor_directory', 'patient_appointments',
+        'doctor_appointments', 'notifications', 'predict',
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--doctors', type=int, default=500)
+        parser.add_argument('--patients', type=int, default=2000)
+        parser.add_argument('--appointments', type=int, default=20000)
+        parser.add_argument('--iterations', type=int, default=100, help="Measured requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=5, help="Unmeasured requests per scenario.")
+        parser.add_argument('--only', nargs='+', choices=self.scenarios, help="Run only these scenarios.")
+        parser.add_argument('--output', help="Write the results to this JSON file.")
+        parser.add_argument('--baseline', help="Compare against results saved earlier with --output.")
+        parser.add_argument(
+            '--threshold', type=float, default=0.25,
+            help="Relative p50/p95 slowdown against the baseline reported as a regression.",
+        )
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        setup_test_environment(debug=False)
+        try:
+            with transaction.atomic():
+                dataset = self.seed(options)
+                results = {
+                    'meta': self.meta(options, dataset),
+                    'scenarios': self.run_scenarios(options),
+                }
+                transaction.set_rollback(True)
+        finally:
+            teardown_test_environment()
+            caches[getattr(settings, 'DOCTOR_PROFILE_CACHE', 'default')].clear()
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        if options['baseline']:
+            regressions = self.compare(results, options['baseline'], options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} regressions: {', '.join(regressions)}")
+
+    def meta(self, options, dataset):
+        return {
+            'seed': options['seed'],
+            'dataset': dataset,
+            'iterations': options['iterations'],
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'created_at': timezone.now().isoformat(),
+        }
+
+    def seed(self, options):
+        started = time.perf_counter()
+        seeder = Seeder(seed=options['seed'], chunk_size=5000, prefix='bench')
+        doctor_ids, patient_ids = seeder.run(options['doctors'], options['patients'], options['appointments'])
+        self.doctors = list(User.objects.filter(id__in=doctor_ids).order_by('id'))
+        self.patients = list(User.objects.filter(id__in=patient_ids).order_by('id'))
+        self.stdout.write(
+            f"Seeded {len(self.doctors)} doctors, {len(self.patients)} patients and {options['appointments']} "
+            f"appointments in {time.perf_counter() - started:.1f}s"
+        )
+        return {'doctors': len(self.doctors), 'patients': len(self.patients), 'appointments': options['appointments']}
+
+    def client_for(self, user):
+        client = APIClient()
+        # The token /api/login/ would issue, claims included
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    def requests(self):
+        """
+        Scenario name -> (expected status, function returning the next request).
+        """
+        rng = self.rng
+        anonymous = APIClient()
+        patient = self.patients[0]
+        doctor = self.doctors[0]
+        patient_client, doctor_client = self.client_for(patient), self.client_for(doctor)
+        booking_day = iter(range(10 ** 6))
+        symptoms = list(symptoms_dict)
+        directory_cache = caches[getattr(settings, 'DOCTOR_PROFILE_CACHE', 'default')]
+
+        def book():
+            day = next(booking_day)
+            return patient_client.post('/api/appointments/book/', {
+                'doctor_username': rng.choice(self.doctors).username,
+                'date': (datetime.date(2035, 1, 1) + datetime.timedelta(days=day // 32)).isoformat(),
+                'time': f'{9 + day % 32 // 4:02d}:{day % 4 * 15:02d}:00',
+            }, format='json')
+
+        def doctor_search():
+            # Cold: the profile cache is emptied so the search itself is measured
+            directory_cache.clear()
+            return patient_client.get('/api/doctors/', {'q': rng.choice(SEARCH_TERMS)})
+
+        return {
+            'login': (200, lambda: anonymous.post(
+                '/api/login/', {'username': rng.choice(self.patients).username, 'password': SEED_PASSWORD}, format='json'
+            )),
+            'book': (201, book),
+            'doctor_search': (200, doctor_search),
+            'doctor_directory': (200, lambda: patient_client.get('/api/doctors/')),
+            'patient_appointments': (200, lambda: patient_client.get('/api/appointments/patient/')),
+            'doctor_appointments': (200, lambda: doctor_client.get('/api/appointments/doctor/')),
+            'notifications': (200, lambda: patient_client.get('/api/notifications/')),
+            'predict': (200, lambda: patient_client.post(
+                '/api/predict/', {'symptoms': rng.sample(symptoms, rng.randint(2, 6))}, format='json'
+            )),
+        }
+
+    def run_scenarios(self, options):
+        results = {}
+        for name, (expected_status, make_request) in self.requests().items():
+            if options['only'] and name not in options['only']:
+                continue
+            # Same requests for a scenario whether or not the others run
+            self.rng.seed(f"{options['seed']}:{name}")
+            result = self.measure(make_request, expected_status, options['warmup'], options['iterations'])
+            results[name] = result
+            self.print_result(name, result)
+        return results
+
+    def measure(self, make_request, expected_status, warmup, iterations):
+        first = make_request()
+        if first.status_code != expected_status:
+            # e.g. no disease model file on this machine
+            return {'skipped': f"status {first.status_code}: {first.content[:200].decode(errors='replace')}"}
+        for _ in range(warmup):
+            make_request()
+
+        timings, queries, errors = [], [], 0
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            for _ in range(iterations):
+                before = counter.count
+                started = time.perf_counter()
+                response = make_request()
+                timings.append((time.perf_counter() - started) * 1000)
+                queries.append(counter.count - before)
+                errors += response.status_code != expected_status
+
+        timings.sort()
+        percentile = lambda p: timings[min(len(timings) - 1, int(len(timings) * p))]
+        return {
+            'requests': iterations,
+            'errors': errors,
+            'mean_ms': round(statistics.mean(timings), 3),
+            'p50_ms': round(percentile(0.5), 3),
+            'p95_ms': round(percentile(0.95), 3),
+            'p99_ms': round(percentile(0.99), 3),
+            'max_ms': round(timings[-1], 3),
+            'throughput_rps': round(len(timings) / (sum(timings) / 1000), 1),
+            'queries_mean': round(statistics.mean(queries), 2),
+            'queries_max': max(queries),
+        }
+
+    def print_result(self, name, result):
+        if 'skipped' in result:
+            self.stdout.write(f"{name:>20}: skipped ({result['skipped']})")
+            return
+        self.stdout.write(
+            f"{name:>20}: p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms, "
+            f"p99 {result['p99_ms']:.2f} ms, {result['throughput_rps']:.0f} req/s, "
+            f"{result['queries_mean']:.1f} queries, {result['errors']} errors"
+        )
+
+    def compare(self, results, baseline_path, threshold):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)['scenarios']
+
+        regressions = []
+        self.stdout.write(f"Compared with {baseline_path}:")
+        for name, result in results['scenarios'].items():
+            before = baseline.get(name)
+            if not before or 'skipped' in before or 'skipped' in result:
+                continue
+            changes = []
+            regressed = False
+            for metric in ('p50_ms', 'p95_ms'):
+                change = (result[metric] - before[metric]) / before[metric] if before[metric] else 0
+                changes.append(f"{metric} {change:+.0%}")
+                regressed |= change > threshold
+            query_change = result['queries_max'] - before['queries_max']
+            changes.append(f"queries {query_change:+d}")
+            regressed |= query_change > 0 or result['errors'] > before['errors']
+            if regressed:
+                regressions.append(name)
+            self.stdout.write(f"{name:>20}: {', '.join(changes)}{'  REGRESSION' if regressed else ''}")
+        return regressions
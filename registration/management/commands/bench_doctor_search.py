@@ -0,0 +1,109 @@
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from registration.models import User, DoctorProfile
+from registration.search import rebuild_index, search_doctor_profiles
+
+SYLLABLES = ['ra', 'sha', 'ni', 'ka', 'ma', 'li', 'pra', 'de', 'su', 'bi', 'an', 'jo', 'han', 'ri', 'ta', 'mo']
+AREAS = ['Kathmandu', 'Lalitpur', 'Bhaktapur', 'Pokhara', 'Biratnagar', 'Dharan', 'Butwal', 'Chitwan']
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark doctor directory search against the old LIKE filters. "
+        "Seeds profiles in a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            self.seed_profiles(rng, options['profiles'])
+            prefixes = [self.random_name(rng)[:rng.randint(2, 4)] for _ in range(options['queries'])]
+            limit = getattr(settings, 'DOCTOR_SEARCH_MAX_RESULTS', 100)
+
+            # The directory used to filter with LIKE; capped like the index search, so both fetch as many rows
+            legacy = self.measure(
+                lambda prefix: list(
+                    DoctorProfile.objects.filter(user__username__icontains=prefix).select_related('user')[:limit]
+                ),
+                prefixes,
+            )
+            indexed = self.measure(
+                lambda prefix: list(
+                    search_doctor_profiles(DoctorProfile.objects.select_related('user'), name=prefix)
+                ),
+                prefixes,
+            )
+            self.report('LIKE %term%', legacy)
+            self.report('search index', indexed)
+
+            transaction.set_rollback(True)
+
+    def random_name(self, rng):
+        return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+    def seed_profiles(self, rng, count):
+        started = time.perf_counter()
+        password = make_password('bench-password')
+        specializations = [choice for choice, _ in DoctorProfile.SPECIALIZATION_CHOICES]
+
+        users = User.objects.bulk_create(
+            [
+                User(
+                    username=f"{self.random_name(rng)}_{i}",
+                    email=f"bench_doctor_{i}@example.com",
+                    role='doctor',
+                    password=password,
+                )
+                for i in range(count)
+            ],
+            batch_size=5000,
+        )
+        DoctorProfile.objects.bulk_create(
+            [
+                DoctorProfile(
+                    user=user,
+                    specialization=rng.choice(specializations),
+                    profile_picture='doctor_profiles/placeholder.jpg',
+                    certificate_picture='doctor_certificates/placeholder.jpg',
+                    license_number=f"NMC-{i}",
+                    phone='9800000000',
+                    clinic_address=f"Ward {rng.randint(1, 32)}, {rng.choice(AREAS)}",
+                )
+                for i, user in enumerate(users)
+            ],
+            batch_size=5000,
+        )
+        indexed = rebuild_index()
+        self.stdout.write(
+            f"Seeded {count} doctor profiles in {time.perf_counter() - started:.1f}s "
+            f"({indexed} rows in the search index)"
+        )
+
+    def measure(self, run_query, prefixes):
+        timings, counts = [], []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            counts.append(len(run_query(prefix)))
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings, counts
+
+    def report(self, label, measured):
+        timings, counts = sorted(measured[0]), measured[1]
+        percentile = lambda p: timings[min(len(timings) - 1, int(len(timings) * p))]
+        self.stdout.write(
+            f"{label:>12}: mean {statistics.mean(timings):.2f} ms, p50 {percentile(0.5):.2f} ms, "
+            f"p95 {percentile(0.95):.2f} ms, p99 {percentile(0.99):.2f} ms, "
+            f"{statistics.mean(counts):.1f} results per query"
+        )
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from registration.images import generate_variants
+from registration.models import DoctorProfile
+
+
+class Command(BaseCommand):
+    help = "Create missing or outdated thumbnails and WebP variants of doctor profile pictures."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Re-render variants that are already current.")
+
+    def handle(self, *args, **options):
+        profiles = DoctorProfile.objects.exclude(profile_picture='').values_list('id', 'profile_picture', 'picture_variants')
+        pending = [
+            profile_id
+            for profile_id, picture, variants in profiles.iterator()
+            if options['force'] or (variants or {}).get('source') != picture
+        ]
+
+        created = failed = 0
+        started = time.perf_counter()
+        for profile_id in pending:
+            try:
+                if generate_variants(profile_id, force=options['force']):
+                    created += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Doctor profile {profile_id}: {e}")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Created variants for {created} of {len(pending)} profile pictures in {elapsed:.1f}s ({failed} failed)."
+        )
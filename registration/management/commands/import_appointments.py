@@ -0,0 +1,66 @@
+import csv
+import json
+import sys
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from registration.imports import FORMATS, format_for, import_appointments
+
+
+class DryRun(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Import appointments from a CSV or NDJSON file with the columns doctor, patient, "
+        "date, time and optionally status, reason and prescription (usernames for doctor and patient)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=FORMATS, help="Default: from the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=None, help="Rows per batch.")
+        parser.add_argument('--report', help="Write rejected rows to this CSV file ('-' for stdout).")
+        parser.add_argument('--dry-run', action='store_true', help="Validate and roll everything back.")
+
+    def handle(self, *args, **options):
+        file_format = options['file_format'] or format_for(options['path'])
+        if file_format is None:
+            raise CommandError("Cannot tell the format from the file name; pass --format.")
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as lines:
+                # Chunks commit one by one; a dry run keeps them all in one transaction to roll back
+                with transaction.atomic() if options['dry_run'] else nullcontext():
+                    result = import_appointments(lines, file_format, options['chunk_size'])
+                    if options['dry_run']:
+                        raise DryRun
+        except DryRun:
+            pass
+        except OSError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        if options['report'] and result.rejected:
+            self.write_report(options['report'], result.rejected)
+        action = "Would import" if options['dry_run'] else "Imported"
+        self.stdout.write(
+            f"{action} {result.created} appointments, rejected {len(result.rejected)} rows "
+            f"in {elapsed:.2f}s ({result.created / elapsed if elapsed else 0:.0f} rows/s)."
+        )
+
+    def write_report(self, path, rejected):
+        report = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        try:
+            writer = csv.writer(report)
+            writer.writerow(['line', 'reason', 'row'])
+            for rejection in rejected:
+                writer.writerow([rejection['line'], rejection['reason'], json.dumps(rejection['row'], default=str)])
+        finally:
+            if report is not sys.stdout:
+                report.close()
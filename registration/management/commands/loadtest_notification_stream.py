@@ -0,0 +1,190 @@
+import asyncio
+import json
+import logging
+import random
+import resource
+import statistics
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.db import connections
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from registration.api.serializers import CustomTokenObtainPairSerializer
+from registration.authentication import password_marker, user_states
+from registration.events import get_broker
+from registration.models import User
+from registration.seeding import SEED_PASSWORD
+
+STREAM_PATH = '/api/notifications/stream/'
+PREFIX = 'streamload'
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StreamClient:
+    """
+    Minimal in-process ASGI client holding one event stream open.
+    """
+
+    def __init__(self, index, user_id):
+        self.index = index
+        self.user_id = user_id
+        self.status = None
+        self.started = asyncio.Event()
+        self.closed = asyncio.Event()
+        self.request_sent = False
+        self.received = {}  # event id -> arrival time
+
+    def scope(self, token):
+        return {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': STREAM_PATH,
+            'raw_path': STREAM_PATH.encode(),
+            'query_string': f'token={token}'.encode(),
+            'root_path': '',
+            'headers': [(b'host', b'localhost')],
+            'client': ('127.0.0.1', 10000 + self.index % 50000),
+            'server': ('localhost', 80),
+        }
+
+    async def receive(self):
+        if not self.request_sent:
+            self.request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.closed.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+            self.started.set()
+        elif message['type'] == 'http.response.body':
+            arrived = time.perf_counter()
+            for block in message.get('body', b'').decode().split('\n\n'):
+                for line in block.splitlines():
+                    if line.startswith('data: '):
+                        self.received[json.loads(line[len('data: '):])['id']] = arrived
+
+
+class Command(BaseCommand):
+    help = (
+        "Open many idle notification streams against the ASGI application in this "
+        "process, publish events to them and report memory, queries and delivery latency. "
+        "Its patients are created first and deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=2000)
+        parser.add_argument('--idle', type=float, default=5.0, help="Seconds to hold the streams idle.")
+        parser.add_argument('--events', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=f'{PREFIX}_').exists():
+            raise CommandError(f"Users prefixed '{PREFIX}_' exist; delete them or finish the previous run.")
+        password = make_password(SEED_PASSWORD)  # Hashed once for all of them
+        users = User.objects.bulk_create([
+            User(username=f'{PREFIX}_{i}', email=f'{PREFIX}_{i}@example.com', role='patient', password=password)
+            for i in range(options['connections'])
+        ])
+        # Login tokens, minted here because issuing one records it in the database
+        tokens = [str(CustomTokenObtainPairSerializer.get_token(user).access_token) for user in users]
+        # A warm process: token checks are answered from memory, as for clients that reconnect
+        for user in users:
+            user_states.set(user.pk, (True, user.username, user.role, password_marker(password)))
+
+        logging.getLogger('registration.performance').setLevel(logging.ERROR)  # Opening thousands at once is slow by design
+        self.queries = 0
+        connection_created.connect(self.count_queries)
+        for connection in connections.all():
+            connection.execute_wrappers.append(self.query_counter)
+        try:
+            asyncio.run(self.run(users, tokens, options))
+        finally:
+            connection_created.disconnect(self.count_queries)
+            user_ids = [user.pk for user in users]
+            OutstandingToken.objects.filter(user_id__in=user_ids).delete()
+            User.objects.filter(pk__in=user_ids).delete()
+
+    def count_queries(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self.query_counter)
+
+    def query_counter(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    async def run(self, users, tokens, options):
+        application = get_asgi_application()
+        broker = get_broker()
+        rng = random.Random(options['seed'])
+        count = len(users)
+
+        clients = [(StreamClient(index, user_id=user.pk), token) for index, (user, token) in enumerate(zip(users, tokens))]
+
+        rss_before = rss_mb()
+        queries_before_open = self.queries
+        started = time.perf_counter()
+        tasks = [
+            asyncio.create_task(application(client.scope(token), client.receive, client.send))
+            for client, token in clients
+        ]
+        await asyncio.wait_for(asyncio.gather(*(client.started.wait() for client, _ in clients)), timeout=120)
+        opened = time.perf_counter() - started
+        statuses = {client.status for client, _ in clients}
+        if statuses != {200}:
+            for client, _ in clients:
+                client.closed.set()
+            await asyncio.wait(tasks, timeout=30)
+            raise CommandError(f"Streams were refused: statuses {sorted(statuses)}")
+        rss_growth = rss_mb() - rss_before
+        self.stdout.write(
+            f"Opened {count} streams in {opened:.2f}s (statuses {sorted(statuses)}), "
+            f"{broker.connection_count()} subscribed, {self.queries - queries_before_open} queries, "
+            f"RSS +{rss_growth:.1f} MB ({rss_growth * 1024 / count:.1f} KB per stream)"
+        )
+
+        queries_before_idle = self.queries
+        await asyncio.sleep(options['idle'])
+        self.stdout.write(f"Idle for {options['idle']:.1f}s: {self.queries - queries_before_idle} database queries")
+
+        published = {}
+        for event_id in range(1, options['events'] + 1):
+            client, _ = rng.choice(clients)
+            published[event_id] = (client, time.perf_counter())
+            broker.publish(client.user_id, {'id': event_id, 'event_type': 'appointment_confirmed'})
+            if event_id % 50 == 0:
+                await asyncio.sleep(0)
+        await asyncio.sleep(0.5)
+
+        latencies = [
+            (client.received[event_id] - sent_at) * 1000
+            for event_id, (client, sent_at) in published.items()
+            if event_id in client.received
+        ]
+        if latencies:
+            latencies.sort()
+            self.stdout.write(
+                f"Delivered {len(latencies)}/{len(published)} events, latency p50 "
+                f"{statistics.median(latencies):.2f} ms, p99 {latencies[int(len(latencies) * 0.99) - 1]:.2f} ms"
+            )
+        else:
+            self.stdout.write(f"Delivered 0/{len(published)} events")
+
+        for client, _ in clients:
+            client.closed.set()
+        await asyncio.wait(tasks, timeout=30)
+        self.stdout.write(f"Closed all streams, {broker.connection_count()} still subscribed")
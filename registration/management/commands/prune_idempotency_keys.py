@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from registration.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete expired idempotency keys in small transactions. Run it from cron, e.g. daily."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Keys deleted per transaction.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+        started = time.perf_counter()
+        while True:
+            with transaction.atomic():
+                ids = list(
+                    IdempotencyKey.objects.filter(expires_at__lte=now)
+                    .order_by('expires_at').values_list('id', flat=True)[:options['chunk_size']]
+                )
+                if not ids:
+                    break
+                deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Deleted {deleted} expired idempotency keys in {elapsed:.1f}s; {IdempotencyKey.objects.count()} left."
+        )
@@ -0,0 +1,46 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from registration.blacklist import prune_expired_tokens, token_table_sizes
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired outstanding and blacklisted JWT refresh tokens in small transactions, "
+        "reporting the table sizes and the delete rate. Run it from cron, e.g. hourly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Tokens deleted per transaction.")
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between chunks.")
+        parser.add_argument(
+            '--grace', type=int, default=0, help="Keep tokens that expired less than this many minutes ago.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(minutes=options['grace'])
+        before = token_table_sizes(cutoff)
+        self.stdout.write(
+            f"Before: {before['outstanding']} outstanding tokens ({before['expired']} expired), "
+            f"{before['blacklisted']} blacklisted"
+        )
+
+        started = time.perf_counter()
+        stats = prune_expired_tokens(
+            cutoff, options['chunk_size'], options['pause'],
+            progress=lambda stats: self.stdout.write(f"  {stats['outstanding']} deleted")
+            if options['verbosity'] > 1 else None,
+        )
+        elapsed = time.perf_counter() - started
+        deleted = stats['outstanding'] + stats['blacklisted']
+
+        after = token_table_sizes()
+        self.stdout.write(
+            f"Deleted {stats['outstanding']} outstanding and {stats['blacklisted']} blacklisted tokens "
+            f"in {stats['chunks']} chunks, {elapsed:.1f}s ({deleted / elapsed if elapsed else 0:,.0f} rows/s, "
+            f"longest chunk {stats['longest_chunk'] * 1000:.0f} ms)"
+        )
+        self.stdout.write(f"After: {after['outstanding']} outstanding tokens, {after['blacklisted']} blacklisted")
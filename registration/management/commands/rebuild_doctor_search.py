@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from registration.search import rebuild_index, uses_fts
+
+
+class Command(BaseCommand):
+    help = "Rebuild the doctor directory search index, e.g. after bulk imports."
+
+    def handle(self, *args, **options):
+        if not uses_fts():
+            self.stdout.write("This database searches its own trigram indexes; nothing to rebuild.")
+            return
+        count = rebuild_index()
+        self.stdout.write(f"Indexed {count} doctor profiles.")
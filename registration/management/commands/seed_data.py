@@ -0,0 +1,49 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from registration.models import User
+from registration.seeding import REFERENCE_DATE, SEED_PASSWORD, Seeder
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a deterministic synthetic dataset for load testing: doctors across every "
+        f"specialization, patients, appointments and notifications. All users get the password '{SEED_PASSWORD}'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=10000)
+        parser.add_argument('--patients', type=int, default=1000000)
+        parser.add_argument('--appointments', type=int, default=10000000)
+        parser.add_argument('--notifications', type=int, default=None, help="Default: one per appointment.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--chunk-size', type=int, default=10000, help="Rows per bulk insert transaction.")
+        parser.add_argument('--prefix', default='seed', help="Username prefix of the generated users.")
+        parser.add_argument(
+            '--reference-date', type=datetime.date.fromisoformat, default=REFERENCE_DATE,
+            help=f"The dataset's today: earlier appointments are in the past (default {REFERENCE_DATE}).",
+        )
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=f"{options['prefix']}_").exists():
+            raise CommandError(f"Users prefixed '{options['prefix']}_' already exist; pick another --prefix.")
+        if options['doctors'] < 1 or options['patients'] < 1:
+            raise CommandError("At least one doctor and one patient are needed.")
+
+        seeder = Seeder(
+            seed=options['seed'], chunk_size=options['chunk_size'], prefix=options['prefix'],
+            reference_date=options['reference_date'],
+            progress=lambda message: self.stdout.write(f"  {message}") if options['verbosity'] > 1 else None,
+        )
+        started = time.perf_counter()
+        seeder.run(options['doctors'], options['patients'], options['appointments'], options['notifications'])
+        elapsed = time.perf_counter() - started
+
+        total = 0
+        for table, (rows, seconds) in seeder.stats.items():
+            if table != 'search index':
+                total += rows
+            self.stdout.write(f"{table:>24}: {rows:>10} rows in {seconds:7.1f}s ({rows / seconds if seconds else 0:,.0f} rows/s)")
+        self.stdout.write(f"Seeded {total} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f} rows/s)")
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from registration.outbox import drain_outbox, outbox_stats
+
+
+class Command(BaseCommand):
+    help = "Deliver queued notification emails from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Emails claimed per batch.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain the outbox once and exit.")
+        parser.add_argument('--stats', action='store_true', help="Print queue depth and exit.")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.print_stats()
+            return
+
+        while True:
+            started = time.monotonic()
+            sent, failed = drain_outbox(batch_size=options['batch_size'])
+            if sent or failed:
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"Sent {sent}, failed {failed} in {elapsed:.2f}s")
+                self.print_stats()
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+    def print_stats(self):
+        stats = outbox_stats()
+        self.stdout.write(" ".join(f"{key}={value}" for key, value in stats.items()))
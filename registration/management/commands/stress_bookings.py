@@ -0,0 +1,110 @@
+import datetime
+import logging
+import multiprocessing
+import statistics
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test.utils import setup_test_environment
+from rest_framework.test import APIClient
+
+from registration.api.serializers import CustomTokenObtainPairSerializer
+from registration.models import User, Appointment
+from registration.seeding import SEED_PASSWORD, SLOT_TIMES
+
+PREFIX = 'stress'
+FIRST_DAY = datetime.date(2040, 1, 1)
+
+
+def book(worker, processes, doctor_ids, patient_id, duration):
+    """
+    Book distinct slots as one patient for `duration` seconds; runs in its own process.
+    """
+    connections.close_all()  # Never share the parent's connection
+    setup_test_environment(debug=False)
+    logging.getLogger('registration.performance').setLevel(logging.ERROR)  # Lock waits make many requests slow
+    patient = User.objects.get(pk=patient_id)
+    doctors = list(User.objects.filter(pk__in=doctor_ids).order_by('pk').values_list('username', flat=True))
+    client = APIClient(raise_request_exception=False)  # Lock errors count as 500s
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {CustomTokenObtainPairSerializer.get_token(patient).access_token}')
+
+    latencies, statuses = [], Counter()
+    deadline = time.perf_counter() + duration
+    booking = 0
+    while time.perf_counter() < deadline:
+        # Slots are numbered across all workers so none are booked twice
+        slot = booking * processes + worker
+        day, index = divmod(slot // len(doctors), len(SLOT_TIMES))
+        started = time.perf_counter()
+        response = client.post('/api/appointments/book/', {
+            'doctor_username': doctors[slot % len(doctors)],
+            'date': (FIRST_DAY + datetime.timedelta(days=day)).isoformat(),
+            'time': SLOT_TIMES[index].isoformat(),
+        }, format='json')
+        latencies.append(time.perf_counter() - started)
+        statuses[response.status_code] += 1
+        booking += 1
+    connections.close_all()
+    return latencies, statuses
+
+
+class Command(BaseCommand):
+    help = (
+        "Book appointments from several processes at once against the configured database and report "
+        "sustained throughput, latency and errors. Its users are created first and deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=10, help="Seconds each process keeps booking.")
+        parser.add_argument('--doctors', type=int, default=2, help="Doctors sharing the bookings, i.e. the contention.")
+        parser.add_argument('--keep', action='store_true', help="Keep the users and appointments created.")
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=f'{PREFIX}_').exists():
+            raise CommandError(f"Users prefixed '{PREFIX}_' exist; delete them or finish the previous run.")
+        processes = options['processes']
+        doctor_ids = [
+            User.objects.create_user(f'{PREFIX}_doctor_{i}', f'{PREFIX}_doctor_{i}@example.com', SEED_PASSWORD, role='doctor').pk
+            for i in range(options['doctors'])
+        ]
+        patient_ids = [
+            User.objects.create_user(f'{PREFIX}_patient_{i}', f'{PREFIX}_patient_{i}@example.com', SEED_PASSWORD, role='patient').pk
+            for i in range(processes)
+        ]
+
+        try:
+            connections.close_all()
+            started = time.perf_counter()
+            with multiprocessing.get_context('fork').Pool(processes) as pool:
+                results = pool.starmap(book, [
+                    (worker, processes, doctor_ids, patient_ids[worker], options['duration']) for worker in range(processes)
+                ])
+            elapsed = time.perf_counter() - started
+            self.report(results, elapsed, doctor_ids)
+        finally:
+            if not options['keep']:
+                User.objects.filter(pk__in=doctor_ids + patient_ids).delete()
+
+    def report(self, results, elapsed, doctor_ids):
+        latencies = sorted(latency * 1000 for worker_latencies, _ in results for latency in worker_latencies)
+        statuses = sum((worker_statuses for _, worker_statuses in results), Counter())
+        booked = statuses.get(201, 0)
+        percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0
+
+        # Every day's tokens must still be unique
+        duplicates = Appointment.objects.filter(doctor_id__in=doctor_ids).values('doctor_id', 'date', 'token') \
+            .annotate(n=Count('id')).filter(n__gt=1).count()
+
+        self.stdout.write(
+            f"{booked} bookings by {len(results)} processes in {elapsed:.1f}s: {booked / elapsed:,.1f} bookings/s"
+        )
+        self.stdout.write(
+            f"Latency p50 {percentile(0.5):.1f} ms, p95 {percentile(0.95):.1f} ms, p99 {percentile(0.99):.1f} ms, "
+            f"max {latencies[-1] if latencies else 0:.1f} ms"
+            + (f", mean {statistics.mean(latencies):.1f} ms" if latencies else "")
+        )
+        self.stdout.write(f"Responses: {dict(sorted(statuses.items()))}; duplicate tokens: {duplicates}")
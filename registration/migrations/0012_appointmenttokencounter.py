@@ -0,0 +1,49 @@
+# Generated by Django 5.1.4 on 2026-10-18 15:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_token_counters(apps, schema_editor):
+    # Start each existing (doctor, date) counter at the highest token already issued
+    Appointment = apps.get_model('registration', 'Appointment')
+    AppointmentTokenCounter = apps.get_model('registration', 'AppointmentTokenCounter')
+    db_alias = schema_editor.connection.alias
+
+    rows = (
+        Appointment.objects.using(db_alias)
+        .values('doctor_id', 'date')
+        .annotate(last_token=Max('token'))
+    )
+    AppointmentTokenCounter.objects.using(db_alias).bulk_create(
+        [
+            AppointmentTokenCounter(doctor_id=row['doctor_id'], date=row['date'], last_token=row['last_token'] or 0)
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0011_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentTokenCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('last_token', models.PositiveIntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='token_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('doctor', 'date')},
+            },
+        ),
+        migrations.RunPython(seed_token_counters, migrations.RunPython.noop),
+    ]
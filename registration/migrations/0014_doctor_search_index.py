@@ -0,0 +1,51 @@
+from django.db import migrations
+
+FTS_TABLE = 'registration_doctorsearch'
+FTS_COLUMNS = 'username, specialization, clinic_address'
+
+TRIGRAM_INDEXES = {
+    'doctor_username_trgm_idx': ('registration_user', 'username'),
+    'doctor_specialization_trgm_idx': ('registration_doctorprofile', 'specialization'),
+    'doctor_clinic_address_trgm_idx': ('registration_doctorprofile', 'clinic_address'),
+}
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"{FTS_COLUMNS}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {FTS_COLUMNS}) "
+            "SELECT p.id, u.username, p.specialization, COALESCE(p.clinic_address, '') "
+            "FROM registration_doctorprofile p JOIN registration_user u ON u.id = p.user_id"
+        )
+    elif connection.vendor == 'postgresql':
+        # Matches Django's icontains SQL: UPPER(col::text) LIKE UPPER('%term%')
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, (table, column) in TRIGRAM_INDEXES.items():
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif connection.vendor == 'postgresql':
+        for name in TRIGRAM_INDEXES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0013_appointment_notification_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 15:50
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0014_doctor_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='slot_minutes',
+            field=models.PositiveSmallIntegerField(default=15),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='work_end',
+            field=models.TimeField(default=datetime.time(17, 0)),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='work_start',
+            field=models.TimeField(default=datetime.time(9, 0)),
+        ),
+    ]
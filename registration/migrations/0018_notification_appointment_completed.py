@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0017_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='event_type',
+            field=models.CharField(choices=[('appointment_confirmed', 'Appointment Confirmed'), ('appointment_canceled', 'Appointment Canceled'), ('prescription_uploaded', 'Prescription Uploaded'), ('appointment_created', 'Appointment Created'), ('appointment_rescheduled', 'Appointment Rescheduled'), ('appointment_completed', 'Appointment Completed')], max_length=50),
+        ),
+    ]
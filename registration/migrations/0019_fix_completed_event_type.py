@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def fix_completed_event_type(apps, schema_editor):
+    # Completion notifications used to be stored as 'Appointment_completed', which is not a valid choice
+    Notification = apps.get_model('registration', 'Notification')
+    Notification.objects.using(schema_editor.connection.alias).filter(
+        event_type='Appointment_completed'
+    ).update(event_type='appointment_completed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0018_notification_appointment_completed'),
+    ]
+
+    operations = [
+        migrations.RunPython(fix_completed_event_type, migrations.RunPython.noop),
+    ]
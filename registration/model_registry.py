@@ -0,0 +1,116 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import joblib
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = Path(__file__).resolve().parent / 'randomforest.pkl'
+
+
+class LoadedModel(namedtuple(
+    'LoadedModel', ['model', 'version', 'path', 'mtime_ns', 'size', 'loaded_at', 'load_time_ms']
+)):
+    __slots__ = ()
+
+    def info(self):
+        """
+        Version details reported alongside predictions.
+        """
+        return {
+            'version': self.version,
+            'loaded_at': self.loaded_at.isoformat(),
+            'load_time_ms': self.load_time_ms,
+        }
+
+
+class ModelUnavailable(Exception):
+    pass
+
+
+class ModelRegistry:
+    """
+    Loads the disease prediction model once per process and swaps in a new
+    artifact when the file on disk changes.
+
+    Readers always get a complete `LoadedModel` snapshot, so a reload never
+    exposes a half-loaded model. If a new file cannot be loaded (e.g. it is
+    still being copied) the previous model keeps serving and the load is
+    retried on the next check. Deploy new models with an atomic rename.
+    """
+
+    def __init__(self, path=None, check_interval=None):
+        self._path = path
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._loaded = None
+        self._checked_at = 0.0
+
+    @property
+    def path(self):
+        return Path(self._path or getattr(settings, 'DISEASE_MODEL_PATH', None) or DEFAULT_MODEL_PATH)
+
+    @property
+    def check_interval(self):
+        if self._check_interval is not None:
+            return self._check_interval
+        return getattr(settings, 'DISEASE_MODEL_CHECK_INTERVAL', 5)
+
+    def get(self):
+        """
+        Return the current `LoadedModel`, loading or reloading it if needed.
+        """
+        loaded = self._loaded
+        if loaded is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return loaded
+
+        with self._lock:
+            loaded = self._loaded
+            if loaded is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return loaded
+            try:
+                self._loaded = self._refresh(loaded)
+            except Exception as e:
+                if loaded is None:
+                    raise ModelUnavailable(f"Disease prediction model could not be loaded: {e}") from e
+                logger.exception("Keeping model %s; reloading %s failed", loaded.version, self.path)
+            finally:
+                self._checked_at = time.monotonic()
+            return self._loaded
+
+    def _refresh(self, loaded):
+        path = self.path
+        stat = os.stat(path)
+        if loaded is not None and (stat.st_mtime_ns, stat.st_size) == (loaded.mtime_ns, loaded.size):
+            return loaded
+
+        started = time.perf_counter()
+        data = path.read_bytes()
+        version = hashlib.sha256(data).hexdigest()[:12]
+        if loaded is not None and version == loaded.version:
+            # Touched but unchanged
+            return loaded._replace(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+
+        model = joblib.load(io.BytesIO(data))
+        load_time_ms = round((time.perf_counter() - started) * 1000, 2)
+        logger.info("Loaded disease model %s from %s in %.2f ms", version, path, load_time_ms)
+        return LoadedModel(
+            model=model,
+            version=version,
+            path=str(path),
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            loaded_at=timezone.now(),
+            load_time_ms=load_time_ms,
+        )
+
+
+model_registry = ModelRegistry()
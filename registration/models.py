@@ -1,7 +1,12 @@
-from django.db import models
+import datetime
+
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.models import BaseUserManager
+from django.utils import timezone
 # Create your models here.
 
 
@@ -101,6 +106,12 @@ class DoctorProfile(models.Model):
     phone = models.CharField(max_length=15)
     clinic_address = models.TextField(blank=True, null=True)  
     google_map_link = models.URLField(blank=True, null=True)
+    # Daily slot grid offered for booking
+    work_start = models.TimeField(default=datetime.time(9, 0))
+    work_end = models.TimeField(default=datetime.time(17, 0))
+    slot_minutes = models.PositiveSmallIntegerField(default=15)
+    # Resized copies of profile_picture, filled in by registration.images
+    picture_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return f"Dr. {self.user.username} - {self.specialization}"
@@ -117,13 +128,15 @@ class Appointment(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         limit_choices_to={'role': 'doctor'},
-        related_name='appointments_for_doctor'
+        related_name='appointments_for_doctor',
+        db_index=False  # Covered by the (doctor, date, time) unique index
     )
     patient = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         limit_choices_to={'role': 'patient'},
-        related_name='appointments_for_patient'
+        related_name='appointments_for_patient',
+        db_index=False  # Covered by appointment_patient_date_idx
     )
     date = models.DateField()
     time = models.TimeField()
@@ -135,22 +148,71 @@ class Appointment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ('doctor', 'date', 'time')  # Prevent double bookings
+        unique_together = ('doctor', 'date', 'time')  # Prevent double bookings, also serves the doctor's lists
         ordering = ['date', 'time', 'token']
+        indexes = [
+            # Patient's appointment list: patient = ? ORDER BY date, time, id
+            models.Index(fields=['patient', 'date', 'time'], name='appointment_patient_date_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        if not self.token:
-            # Generate sequential token for the day
-            today_appointments = Appointment.objects.filter(
-                doctor=self.doctor, date=self.date
-            ).count()
-            self.token = today_appointments + 1
-        super().save(*args, **kwargs)
+        if self.token:
+            super().save(*args, **kwargs)
+            return
+
+        # Take the next sequential token for the day and insert in one transaction,
+        # so a failed insert gives its token back instead of leaving a gap.
+        try:
+            with transaction.atomic(using=kwargs.get('using')):
+                self.token = AppointmentTokenCounter.next_token(self.doctor_id, self.date)
+                super().save(*args, **kwargs)
+        except Exception:
+            self.token = None
+            raise
 
     def __str__(self):
         return f"Appointment with Dr. {self.doctor.username} for {self.patient.username} on {self.date} at {self.time} - Status: {self.status}"
 
 
+class AppointmentTokenCounter(models.Model):
+    """
+    Last token handed out for a doctor on a given day.
+    """
+    doctor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='token_counters'
+    )
+    date = models.DateField()
+    last_token = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('doctor', 'date')
+
+    @classmethod
+    def next_token(cls, doctor_id, date):
+        """
+        Atomically increment and return the day's counter.
+
+        Must run inside the booking transaction: the UPDATE takes the row
+        (or, on SQLite, the database) write lock and holds it until commit,
+        so concurrent bookings are serialized on this one row.
+        """
+        counter = cls.objects.filter(doctor_id=doctor_id, date=date)
+        if not counter.update(last_token=F('last_token') + 1):
+            try:
+                with transaction.atomic():
+                    cls.objects.create(doctor_id=doctor_id, date=date, last_token=1)
+                return 1
+            except IntegrityError:
+                # Another booking created the row first
+                counter.update(last_token=F('last_token') + 1)
+        return counter.values_list('last_token', flat=True).get()
+
+    def __str__(self):
+        return f"Token counter for doctor {self.doctor_id} on {self.date}: {self.last_token}"
+
+
 class Notification(models.Model):
     EVENT_CHOICES = [
         ('appointment_confirmed', 'Appointment Confirmed'),
@@ -158,12 +220,14 @@ class Notification(models.Model):
         ('prescription_uploaded', 'Prescription Uploaded'),
         ('appointment_created', 'Appointment Created'),
         ('appointment_rescheduled', 'Appointment Rescheduled'),
+        ('appointment_completed', 'Appointment Completed'),
     ]
 
     recipient = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='notifications'
+        related_name='notifications',
+        db_index=False  # Covered by notification_inbox_idx
     )
     event_type = models.CharField(max_length=50, choices=EVENT_CHOICES)
     subject = models.CharField(max_length=255)
@@ -171,5 +235,75 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Inbox: recipient = ? ORDER BY created_at DESC
+            models.Index(fields=['recipient', 'created_at'], name='notification_inbox_idx'),
+            # Unread checks only touch the (small) unread part of the inbox
+            models.Index(
+                fields=['recipient'],
+                condition=models.Q(is_read=False),
+                name='notification_unread_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"Notification for {self.recipient.username} - {self.event_type}"
+
+
+class EmailOutbox(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    notification = models.ForeignKey(
+        Notification,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='emails'
+    )
+    recipient_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)  # Also used as the worker lease
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Email to {self.recipient_email} - {self.subject} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response to a state-changing request sent with an `Idempotency-Key` header,
+    replayed when the client retries it (see registration.idempotency).
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys',
+        db_index=False  # Covered by the unique constraint
+    )
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # Of the method, path and payload
+    response_status = models.PositiveSmallIntegerField(null=True)  # Null until the request has finished
+    response_data = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f"Idempotency key {self.key} of user {self.user_id} ({self.response_status})"
@@ -0,0 +1,154 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import EmailOutbox
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def claim_batch(batch_size):
+    """
+    Claim up to `batch_size` due emails for this worker.
+
+    Claimed rows get their `next_attempt_at` pushed forward by the lease, so
+    other workers skip them; if this worker dies they become due again once
+    the lease runs out.
+    """
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=_setting('OUTBOX_LEASE_SECONDS', 300))
+
+    with transaction.atomic():
+        queryset = EmailOutbox.objects.filter(
+            status='pending', next_attempt_at__lte=now
+        ).order_by('next_attempt_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+
+        entries = list(queryset[:batch_size])
+        if entries:
+            EmailOutbox.objects.filter(id__in=[entry.id for entry in entries]).update(
+                next_attempt_at=lease_until
+            )
+    return entries
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff for the given number of failed attempts.
+    """
+    base = _setting('OUTBOX_RETRY_BASE_SECONDS', 30)
+    cap = _setting('OUTBOX_RETRY_MAX_SECONDS', 3600)
+    return timedelta(seconds=min(cap, base * 2 ** (attempts - 1)))
+
+
+def record_failure(entry, error, max_attempts):
+    """
+    Count a failed attempt: back off, or give up after `max_attempts`.
+    """
+    entry.attempts += 1
+    entry.last_error = str(error)
+    if entry.attempts >= max_attempts:
+        entry.status = 'failed'
+    else:
+        entry.next_attempt_at = timezone.now() + retry_delay(entry.attempts)
+    entry.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def deliver_batch(entries, mail_connection):
+    """
+    Send the claimed emails over an already opened connection.
+
+    Returns a `(sent, failed)` tuple of counts.
+    """
+    max_attempts = _setting('OUTBOX_MAX_ATTEMPTS', 5)
+    from_email = settings.DEFAULT_FROM_EMAIL
+    sent_ids = []
+    failed = 0
+
+    for index, entry in enumerate(entries):
+        email = EmailMessage(
+            subject=entry.subject,
+            body=entry.message,
+            from_email=from_email,
+            to=[entry.recipient_email],
+            connection=mail_connection,
+        )
+        try:
+            mail_connection.send_messages([email])
+        except Exception as e:
+            failed += 1
+            record_failure(entry, e, max_attempts)
+            # A broken session should not poison the rest of the batch: start a new one, once
+            try:
+                mail_connection.close()
+            except Exception:
+                pass  # Already dropped by the server
+            try:
+                mail_connection.open()
+            except Exception as error:
+                # The server is unreachable; the rest of the batch backs off too
+                for remaining in entries[index + 1:]:
+                    record_failure(remaining, error, max_attempts)
+                failed += len(entries) - index - 1
+                break
+        else:
+            sent_ids.append(entry.id)
+
+    if sent_ids:
+        EmailOutbox.objects.filter(id__in=sent_ids).update(
+            status='sent', sent_at=timezone.now(), last_error=None
+        )
+    return len(sent_ids), failed
+
+
+def drain_outbox(batch_size=None, mail_connection=None):
+    """
+    Deliver due emails batch by batch until none are left.
+
+    A single SMTP connection is opened for the whole run and reused across
+    batches. Returns a `(sent, failed)` tuple of counts.
+    """
+    batch_size = batch_size or _setting('OUTBOX_BATCH_SIZE', 50)
+    mail_connection = mail_connection or get_connection(fail_silently=False)
+    sent = failed = 0
+
+    try:
+        while True:
+            entries = claim_batch(batch_size)
+            if not entries:
+                break
+            mail_connection.open()  # No-op when the session is still open
+            batch_sent, batch_failed = deliver_batch(entries, mail_connection)
+            sent += batch_sent
+            failed += batch_failed
+    finally:
+        mail_connection.close()
+
+    return sent, failed
+
+
+def outbox_stats():
+    """
+    Queue depth and age of the oldest undelivered email, in one query.
+    """
+    now = timezone.now()
+    stats = EmailOutbox.objects.aggregate(
+        due=Count('id', filter=Q(status='pending', next_attempt_at__lte=now)),
+        scheduled=Count('id', filter=Q(status='pending', next_attempt_at__gt=now)),
+        retrying=Count('id', filter=Q(status='pending', attempts__gt=0)),
+        failed=Count('id', filter=Q(status='failed')),
+        sent=Count('id', filter=Q(status='sent')),
+        oldest_pending=Min('created_at', filter=Q(status='pending')),
+    )
+    oldest_pending = stats.pop('oldest_pending')
+    stats['oldest_pending_age_seconds'] = (
+        round((now - oldest_pending).total_seconds(), 1) if oldest_pending else 0
+    )
+    return stats
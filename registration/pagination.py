@@ -0,0 +1,98 @@
+import base64
+from datetime import date, time
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+from rest_framework.utils.urls import replace_query_param
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def encode_cursor(appointment):
+    raw = f"{appointment.date.isoformat()}|{appointment.time.isoformat()}|{appointment.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        cursor_date, cursor_time, cursor_id = raw.split('|')
+        return date.fromisoformat(cursor_date), time.fromisoformat(cursor_time), int(cursor_id)
+    except (ValueError, UnicodeError):
+        raise PaginationError("Invalid cursor.")
+
+
+def filter_appointments(queryset, params):
+    """
+    Apply the `status`, `date_from` and `date_to` query parameters.
+    """
+    statuses = [value for value in params.get('status', '').split(',') if value]
+    if statuses:
+        valid_statuses = {choice for choice, _ in queryset.model.STATUS_CHOICES}
+        if not set(statuses) <= valid_statuses:
+            raise PaginationError(f"Invalid status. Allowed statuses: {sorted(valid_statuses)}.")
+        queryset = queryset.filter(status__in=statuses)
+
+    for param, lookup in (('date_from', 'date__gte'), ('date_to', 'date__lte')):
+        value = params.get(param)
+        if value:
+            try:
+                parsed = parse_date(value)
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                raise PaginationError(f"'{param}' must be a date in YYYY-MM-DD format.")
+            queryset = queryset.filter(**{lookup: parsed})
+    return queryset
+
+
+def get_page_size(params):
+    default = getattr(settings, 'APPOINTMENT_PAGE_SIZE', 50)
+    maximum = getattr(settings, 'APPOINTMENT_MAX_PAGE_SIZE', 200)
+    try:
+        page_size = int(params.get('page_size', default))
+    except ValueError:
+        raise PaginationError("'page_size' must be an integer.")
+    return max(1, min(page_size, maximum))
+
+
+def paginate_appointments(request, queryset, descending=True):
+    """
+    Keyset pagination over (date, time, id).
+
+    Each page continues strictly after the last row of the previous page,
+    so the cost of a page does not grow with the size of the history and
+    rows inserted meanwhile never shift or duplicate results. Returns the
+    page of appointments and the URL of the next page (or None).
+    """
+    params = request.query_params
+    queryset = filter_appointments(queryset, params)
+    page_size = get_page_size(params)
+
+    cursor = params.get('cursor')
+    if cursor:
+        cursor_date, cursor_time, cursor_id = decode_cursor(cursor)
+        if descending:
+            queryset = queryset.filter(date__lte=cursor_date).filter(
+                Q(date__lt=cursor_date)
+                | Q(time__lt=cursor_time)
+                | Q(time=cursor_time, id__lt=cursor_id)
+            )
+        else:
+            queryset = queryset.filter(date__gte=cursor_date).filter(
+                Q(date__gt=cursor_date)
+                | Q(time__gt=cursor_time)
+                | Q(time=cursor_time, id__gt=cursor_id)
+            )
+
+    ordering = ['-date', '-time', '-id'] if descending else ['date', 'time', 'id']
+    page = list(queryset.order_by(*ordering)[:page_size + 1])
+
+    next_url = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', encode_cursor(page[-1]))
+    return page, next_url
@@ -8,3 +8,12 @@ class IsRegistered(BasePermission):
         if request.user.is_authenticated and request.user.role in ['doctor', 'patient']:
             return True
         return False
+
+
+class IsAdmin(BasePermission):
+    """
+    Allow access only to admins: users with the admin role or staff status.
+    """
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user.is_authenticated and (user.role == 'admin' or user.is_staff))
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.http import quote_etag
+
+from .routers import primary
+
+# Bump when the cached representation changes so old entries are never served
+SCHEMA_VERSION = 2
+GENERATION_KEY = f'doctor-directory:{SCHEMA_VERSION}:generation'
+
+
+class CacheStats:
+    """
+    Hit/miss counters of this process's lookups.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+
+    def record(self, kind, hit):
+        with self._lock:
+            counter = self.counters.setdefault(kind, {'hits': 0, 'misses': 0})
+            counter['hits' if hit else 'misses'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counters = {kind: dict(counter) for kind, counter in self.counters.items()}
+        for counter in counters.values():
+            lookups = counter['hits'] + counter['misses']
+            counter['hit_ratio'] = round(counter['hits'] / lookups, 4) if lookups else None
+        return counters
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    return caches[getattr(settings, 'DOCTOR_PROFILE_CACHE', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'DOCTOR_PROFILE_CACHE_TTL', 300)
+
+
+def get_generation(cache):
+    # Seeded from the clock, so a generation key lost to eviction never revives old entries
+    return cache.get_or_set(GENERATION_KEY, time.time_ns, None)
+
+
+def profile_key(generation, doctor_id):
+    return f'doctor-profile:{SCHEMA_VERSION}:{generation}:{doctor_id}'
+
+
+def directory_key(generation, params):
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return f'doctor-directory:{SCHEMA_VERSION}:{generation}:{digest}'
+
+
+def make_entry(data):
+    """
+    Pair serialized data with its ETag, computed once when the entry is filled.
+    """
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+    return quote_etag(hashlib.md5(body).hexdigest()), data
+
+
+def get_profile(doctor_id, build):
+    """
+    Return `(etag, data)` for one public profile, calling `build()` on a miss.
+
+    `build` returns the serialized profile, or None when there is none;
+    missing profiles are not cached.
+
+    All keys embed a generation number that any profile change bumps,
+    retiring every cached profile and listing at once. The generation is
+    read before the database, so an entry built from data that changed
+    meanwhile lands under the retired generation and is never served.
+    """
+    cache = get_cache()
+    key = profile_key(get_generation(cache), doctor_id)
+    entry = cache.get(key)
+    stats.record('profile', entry is not None)
+    if entry is None:
+        with primary():  # A lagging replica's data would stay cached until the next change
+            data = build()
+        if data is None:
+            return None
+        entry = make_entry(data)
+        cache.set(key, entry, get_timeout())
+    return entry
+
+
+def get_directory(params, build):
+    """
+    Return `(etag, data)` for a directory listing, keyed by its query parameters.
+    """
+    cache = get_cache()
+    key = directory_key(get_generation(cache), params)
+    entry = cache.get(key)
+    stats.record('directory', entry is not None)
+    if entry is None:
+        with primary():
+            entry = make_entry(build())
+        cache.set(key, entry, get_timeout())
+    return entry
+
+
+def invalidate():
+    try:
+        get_cache().incr(GENERATION_KEY)
+    except ValueError:
+        # Not cached yet (or evicted): the next lookup starts a fresh generation
+        pass
@@ -0,0 +1,39 @@
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+
+def is_lock_error(error):
+    # SQLITE_BUSY ("database is locked") and, with a shared cache, SQLITE_LOCKED ("database table is locked")
+    return isinstance(error, OperationalError) and 'locked' in str(error)
+
+
+def retry_on_lock(view_method):
+    """
+    Run a write view method in one transaction and run it again, after a
+    short randomized backoff, when SQLite still reports the database locked
+    once its busy timeout has run out.
+
+    The transaction makes a retry safe: a failed attempt leaves nothing
+    behind. Inside an outer transaction the method runs once, as is.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if connection.in_atomic_block:
+            return view_method(self, request, *args, **kwargs)
+        retries = getattr(settings, 'SQLITE_LOCK_RETRIES', 3)
+        delay = getattr(settings, 'SQLITE_LOCK_RETRY_DELAY', 0.05)
+        for attempt in range(retries + 1):
+            try:
+                with transaction.atomic():
+                    return view_method(self, request, *args, **kwargs)
+            except OperationalError as e:
+                if attempt == retries or not is_lock_error(e):
+                    raise
+            time.sleep(delay * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    return wrapper
@@ -0,0 +1,175 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import SimpleLazyObject
+
+PIN_COOKIE = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Cache backends whose entries other worker processes never see
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# The request being served, or None outside requests and while reads must see the primary
+_request = ContextVar('replica_request', default=None)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+def pin_cache():
+    return caches[getattr(settings, 'REPLICA_PIN_CACHE', 'default')]
+
+
+@checks.register(checks.Tags.caches, checks.Tags.database)
+def check_pin_cache(app_configs, **kwargs):
+    """
+    With replicas, a pin set by the worker that served a write must be seen by the worker serving the next read.
+    """
+    if not replicas():
+        return []
+    alias = getattr(settings, 'REPLICA_PIN_CACHE', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHES:
+        return [checks.Error(
+            f"REPLICA_PIN_CACHE '{alias}' uses {backend}, which is not shared between processes.",
+            hint="Point REPLICA_PIN_CACHE at a cache all workers share (file, database, Redis or Memcached).",
+            id='registration.E001',
+        )]
+    return []
+
+
+def pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def request_user(request):
+    # Only a user DRF has already authenticated; Django's lazy session user would cost a query
+    user = request.__dict__.get('user')
+    if user is None or isinstance(user, SimpleLazyObject) or not user.is_authenticated:
+        return None
+    return user
+
+
+def pinned(request):
+    """
+    Whether the client wrote recently enough that replicas may not have caught up.
+
+    Decided once per request, as soon as the cookie or the authenticated user tells.
+    """
+    if hasattr(request, '_pinned_to_primary'):
+        return request._pinned_to_primary
+    try:
+        if float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time():
+            request._pinned_to_primary = True
+            return True
+    except ValueError:
+        pass
+    user = request_user(request)
+    if user is None:
+        return False  # Not authenticated (yet)
+    request._pinned_to_primary = pin_cache().get(pin_key(user.pk)) is not None
+    return request._pinned_to_primary
+
+
+def read_from_replica():
+    request = _request.get()
+    if request is None or request.method not in SAFE_METHODS:
+        return False
+    # Reads inside a transaction must see its writes
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return False
+    return not pinned(request)
+
+
+@contextmanager
+def primary():
+    """
+    Send the reads of the block to the primary, e.g. to fill a cache that outlives the request.
+    """
+    token = _request.set(None)
+    try:
+        yield
+    finally:
+        _request.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of GET/HEAD/OPTIONS requests to a random database of
+    DATABASE_REPLICAS and everything else to `default`. A client that wrote
+    in the last REPLICA_PIN_SECONDS reads from `default` too: browsers carry
+    a cookie, API clients are remembered by user id in REPLICA_PIN_CACHE,
+    which all workers must share.
+    Without replicas every query goes to `default`.
+    """
+
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if aliases and read_from_replica():
+            return random.choice(aliases)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Makes the request visible to `ReplicaRouter` and pins clients to the primary after they write.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _request.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        token = _request.set(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self.finish(request, response)
+
+    def finish(self, request, response):
+        if request.method in SAFE_METHODS or not replicas():
+            return response
+        seconds = pin_seconds()
+        response.set_cookie(PIN_COOKIE, f'{time.time() + seconds:.3f}', max_age=seconds, httponly=True, samesite='Lax')
+        user = request_user(request)
+        if user is not None:
+            pin_cache().set(pin_key(user.pk), True, seconds)
+        return response
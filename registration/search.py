@@ -0,0 +1,153 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+# SQLite FTS5 table mirroring the searchable doctor fields; rowid is the DoctorProfile id.
+FTS_TABLE = 'registration_doctorsearch'
+FTS_COLUMNS = ('username', 'specialization', 'clinic_address')
+# bm25 column weights: a name hit ranks above a specialization hit, above an address hit
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Query parameter -> FTS column and the ORM field used on other backends
+SEARCH_FIELDS = {
+    'name': ('username', 'user__username'),
+    'specialization': ('specialization', 'specialization'),
+}
+ALL_FIELDS = ('user__username', 'specialization', 'clinic_address')
+
+CREATE_FTS_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{', '.join(FTS_COLUMNS)}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+
+INDEX_SELECT_SQL = (
+    "SELECT p.id, u.username, p.specialization, COALESCE(p.clinic_address, '') "
+    "FROM registration_doctorprofile p JOIN registration_user u ON u.id = p.user_id"
+)
+
+
+def uses_fts(conn=None):
+    return (conn or connection).vendor == 'sqlite'
+
+
+def search_terms(text):
+    # Same word boundaries as the unicode61 tokenizer, which splits on underscores
+    return re.findall(r'[^\W_]+', text.lower())
+
+
+def index_doctor_profiles(profile_ids):
+    """
+    (Re)index the given doctor profiles. Called from the save signals.
+    """
+    if not uses_fts() or not profile_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(profile_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", list(profile_ids))
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) {INDEX_SELECT_SQL} WHERE p.id IN ({placeholders})",
+            list(profile_ids),
+        )
+
+
+def remove_doctor_profile(profile_id):
+    if not uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [profile_id])
+
+
+def rebuild_index(conn=None):
+    """
+    Repopulate the whole search index, e.g. after bulk loads that skip signals.
+    """
+    conn = conn or connection
+    if not uses_fts(conn):
+        return 0
+    with conn.cursor() as cursor:
+        cursor.execute(CREATE_FTS_SQL)
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) {INDEX_SELECT_SQL}")
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def _prefix_terms(terms):
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def build_match_expression(q=None, **fields):
+    """
+    FTS5 MATCH expression where every term is a quoted prefix query, e.g.
+    `username : ("jo"*) AND ("card"* "kath"*)`.
+    """
+    clauses = []
+    for param, text in fields.items():
+        terms = search_terms(text or '')
+        if terms:
+            column = SEARCH_FIELDS[param][0]
+            clauses.append(f"{column} : ({_prefix_terms(terms)})")
+    terms = search_terms(q or '')
+    if terms:
+        clauses.append(f"({_prefix_terms(terms)})")
+    return ' AND '.join(clauses)
+
+
+def _fts_ranked_ids(expression, limit):
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s",
+            [expression, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_search(queryset, q, fields):
+    terms = search_terms(q or '')
+    for param, text in fields.items():
+        if text:
+            queryset = queryset.filter(**{f"{SEARCH_FIELDS[param][1]}__icontains": text})
+    for term in terms:
+        term_filter = Q()
+        for field in ALL_FIELDS:
+            term_filter |= Q(**{f"{field}__icontains": term})
+        queryset = queryset.filter(term_filter)
+
+    if connection.vendor == 'postgresql' and (terms or any(fields.values())):
+        # Ranked with the pg_trgm indexes created by the search migration
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        text = ' '.join([q or ''] + [value for value in fields.values() if value]).strip()
+        rank = sum(
+            (TrigramWordSimilarity(text, field) for field in ALL_FIELDS[1:]),
+            TrigramWordSimilarity(text, ALL_FIELDS[0]),
+        )
+        return list(queryset.annotate(rank=rank).order_by('-rank', 'id'))
+    return list(queryset.order_by('user__username'))
+
+
+def search_doctor_profiles(queryset, q=None, name=None, specialization=None):
+    """
+    Filter and rank doctor profiles, returning a list with the best matches first.
+
+    `q` matches any of name, specialization and clinic address; `name` and
+    `specialization` are restricted to that field. Every word is matched as
+    a prefix. On SQLite this runs on the FTS5 index; PostgreSQL uses trigram
+    indexes, other backends fall back to LIKE filters.
+    """
+    fields = {'name': name, 'specialization': specialization}
+    if not uses_fts():
+        return _fallback_search(queryset, q, fields)
+
+    expression = build_match_expression(q, **fields)
+    if not expression:
+        return list(queryset.order_by('user__username'))
+
+    ids = _fts_ranked_ids(expression, getattr(settings, 'DOCTOR_SEARCH_MAX_RESULTS', 100))
+    # Keep the index's ranking; sorting by a CASE in SQL costs more than the search itself
+    profiles = queryset.in_bulk(ids)
+    return [profiles[profile_id] for profile_id in ids if profile_id in profiles]
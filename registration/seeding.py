@@ -0,0 +1,214 @@
+import datetime
+import io
+import random
+import string
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+
+from .images import FORMATS, render_variants, variant_sizes
+from .models import User, DoctorProfile, Appointment, AppointmentTokenCounter, Notification
+from . import profile_cache, search
+
+SYLLABLES = ['ra', 'sha', 'ni', 'ka', 'ma', 'li', 'pra', 'de', 'su', 'bi', 'an', 'jo', 'han', 'ri', 'ta', 'mo']
+AREAS = ['Kathmandu', 'Lalitpur', 'Bhaktapur', 'Pokhara', 'Biratnagar', 'Dharan', 'Butwal', 'Chitwan']
+SEED_PASSWORD = 'seed-password'
+# The dataset's "today": appointments before it are past (completed or canceled, notifications read).
+# Fixed, so that a seed always produces the same rows.
+REFERENCE_DATE = datetime.date(2026, 1, 1)
+
+# Daily grid of the generated schedules: 09:00-17:00 in 15 minute slots
+SLOT_TIMES = [datetime.time(9 + index // 4, index % 4 * 15) for index in range(32)]
+EVENTS = {
+    'pending': ('appointment_created', "Appointment Requested"),
+    'confirmed': ('appointment_confirmed', "Appointment Confirmed"),
+    'completed': ('appointment_completed', "Appointment Completed"),
+    'canceled': ('appointment_canceled', "Appointment Canceled"),
+}
+
+
+def placeholder_pictures():
+    """
+    Store one placeholder photo and certificate (and the photo's variants) shared by every seeded doctor.
+
+    Returns the picture names and the `picture_variants` value to give the profiles.
+    """
+    names = {}
+    for field, folder, color in (('profile', 'doctor_profiles', (90, 140, 200)), ('certificate', 'doctor_certificates', (240, 240, 230))):
+        name = f'{folder}/seed-placeholder.jpg'
+        if not default_storage.exists(name):
+            output = io.BytesIO()
+            Image.new('RGB', (640, 640), color).save(output, 'JPEG', quality=80)
+            default_storage.save(name, ContentFile(output.getvalue()))
+        names[field] = name
+
+    variants = {'source': names['profile']}
+    with default_storage.open(names['profile']) as image_file:
+        for size_name, format_key, data in render_variants(image_file, variant_sizes()):
+            path = f"doctor_profiles/variants/seed/seed-placeholder-{size_name}.{FORMATS[format_key][1]}"
+            if not default_storage.exists(path):
+                default_storage.save(path, ContentFile(data))
+            variants.setdefault(size_name, {})[format_key] = path
+    return names['profile'], names['certificate'], variants
+
+
+class Seeder:
+    """
+    Generates a deterministic synthetic dataset with bulk inserts.
+
+    Rows are built and inserted one chunk at a time, each chunk in its own
+    transaction, so memory stays flat however many rows are requested.
+    Every user shares one password hash and appointment tokens are
+    numbered in memory as each doctor's day is generated.
+    """
+
+    def __init__(self, seed=42, chunk_size=10000, prefix='seed', reference_date=REFERENCE_DATE, progress=None):
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.prefix = prefix
+        self.reference_date = reference_date
+        self.start_date = reference_date - datetime.timedelta(days=180)
+        self.progress = progress or (lambda message: None)
+        self.stats = {}  # table -> (rows, seconds)
+
+    def timed(self, table, rows, started):
+        count, seconds = self.stats.get(table, (0, 0.0))
+        self.stats[table] = (count + rows, seconds + time.perf_counter() - started)
+
+    def chunks(self, count):
+        for offset in range(0, count, self.chunk_size):
+            yield range(offset, min(count, offset + self.chunk_size))
+
+    def password(self):
+        # One hash for everyone. The salt comes from the seed, so runs are identical, and
+        # is long enough that Django does not rehash the password on every login.
+        salt = ''.join(self.rng.choice(string.ascii_letters + string.digits) for _ in range(22))
+        return make_password(SEED_PASSWORD, salt=salt)
+
+    def name(self):
+        return ''.join(self.rng.choice(SYLLABLES) for _ in range(self.rng.randint(2, 3)))
+
+    def create_doctors(self, count, password):
+        picture, certificate, variants = placeholder_pictures()
+        specializations = [choice for choice, _ in DoctorProfile.SPECIALIZATION_CHOICES]
+        doctor_ids = []
+        for indexes in self.chunks(count):
+            started = time.perf_counter()
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(username=f'{self.prefix}_dr_{self.name()}_{i}', email=f'{self.prefix}_doctor_{i}@example.com',
+                         role='doctor', password=password)
+                    for i in indexes
+                ])
+                DoctorProfile.objects.bulk_create([
+                    DoctorProfile(
+                        user=user, specialization=specializations[i % len(specializations)],
+                        profile_picture=picture, certificate_picture=certificate, picture_variants=variants,
+                        license_number=f'NMC-{self.seed}-{i}', phone=f'98{self.rng.randrange(10 ** 8):08d}',
+                        clinic_address=f'Ward {self.rng.randint(1, 32)}, {self.rng.choice(AREAS)}',
+                    )
+                    for i, user in zip(indexes, users)
+                ])
+            doctor_ids.extend(user.id for user in users)
+            self.timed('doctors + profiles', 2 * len(users), started)
+        return doctor_ids
+
+    def create_patients(self, count, password):
+        patient_ids = []
+        for indexes in self.chunks(count):
+            started = time.perf_counter()
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(username=f'{self.prefix}_patient_{i}', email=f'{self.prefix}_patient_{i}@example.com',
+                         role='patient', password=password)
+                    for i in indexes
+                ])
+            patient_ids.extend(user.id for user in users)
+            self.timed('patients', len(users), started)
+            self.progress(f"{len(patient_ids)} patients")
+        return patient_ids
+
+    def schedule(self, doctor_ids, patient_ids, count):
+        """
+        Yield `(doctor_id, date, [appointments])` day by day until `count` appointments exist.
+        """
+        quota, remainder = divmod(count, len(doctor_ids)) if doctor_ids else (0, 0)
+        for index, doctor_id in enumerate(doctor_ids):
+            remaining = quota + (index < remainder)
+            date = self.start_date
+            while remaining:
+                date += datetime.timedelta(days=1)
+                if self.rng.random() < 0.25:
+                    continue  # Day off
+                times = sorted(self.rng.sample(SLOT_TIMES, min(remaining, self.rng.randint(4, len(SLOT_TIMES)))))
+                remaining -= len(times)
+                statuses = ('completed', 'completed', 'canceled') if date < self.reference_date else ('pending', 'confirmed')
+                yield doctor_id, date, [
+                    Appointment(
+                        doctor_id=doctor_id, patient_id=self.rng.choice(patient_ids), date=date, time=slot_time,
+                        token=token, status=self.rng.choice(statuses),
+                    )
+                    for token, slot_time in enumerate(times, start=1)
+                ]
+
+    def create_appointments(self, doctor_ids, patient_ids, count, notifications):
+        ratio = notifications / count if count else 0
+        appointments, counters, created = [], [], 0
+        for doctor_id, date, day in self.schedule(doctor_ids, patient_ids, count):
+            appointments.extend(day)
+            counters.append(AppointmentTokenCounter(doctor_id=doctor_id, date=date, last_token=len(day)))
+            if len(appointments) >= self.chunk_size:
+                created = self.flush(appointments, counters, created, ratio)
+                appointments, counters = [], []
+        if appointments:
+            self.flush(appointments, counters, created, ratio)
+
+    def flush(self, appointments, counters, created, ratio):
+        started = time.perf_counter()
+        with transaction.atomic():
+            Appointment.objects.bulk_create(appointments)
+            AppointmentTokenCounter.objects.bulk_create(counters)
+        self.timed('appointments + counters', len(appointments) + len(counters), started)
+
+        # Notifications spread evenly over the appointments, `ratio` per appointment
+        started = time.perf_counter()
+        notifications = []
+        for offset, appointment in enumerate(appointments, start=created):
+            event_type, subject = EVENTS[appointment.status]
+            for _ in range(int((offset + 1) * ratio) - int(offset * ratio)):
+                notifications.append(Notification(
+                    recipient_id=appointment.patient_id, event_type=event_type, subject=subject,
+                    message=f'Your appointment on {appointment.date} at {appointment.time} is {appointment.status}.',
+                    is_read=appointment.date < self.reference_date,
+                ))
+        with transaction.atomic():
+            Notification.objects.bulk_create(notifications)
+        self.timed('notifications', len(notifications), started)
+
+        created += len(appointments)
+        self.progress(f"{created} appointments")
+        return created
+
+    def run(self, doctors, patients, appointments, notifications=None):
+        """
+        Seed the dataset; returns the ids of the doctors and patients created.
+        """
+        password = self.password()
+        doctor_ids = self.create_doctors(doctors, password)
+        patient_ids = self.create_patients(patients, password)
+        if doctor_ids and patient_ids:
+            self.create_appointments(
+                doctor_ids, patient_ids, appointments, appointments if notifications is None else notifications
+            )
+
+        # Bulk inserts skip the signals that maintain these
+        started = time.perf_counter()
+        search.rebuild_index()
+        transaction.on_commit(profile_cache.invalidate)
+        self.timed('search index', doctors, started)
+        return doctor_ids, patient_ids
@@ -0,0 +1,61 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import User, DoctorProfile, Notification
+from .events import get_broker, notification_payload
+from .images import variant_worker, variants_are_current
+from .authentication import invalidate_user
+from . import profile_cache, search
+
+
+def invalidate_profile_cache():
+    # After commit, so a concurrent request cannot cache the data being replaced
+    transaction.on_commit(profile_cache.invalidate)
+
+
+@receiver(post_save, sender=DoctorProfile)
+def index_doctor_profile(sender, instance, **kwargs):
+    search.index_doctor_profiles([instance.id])
+    invalidate_profile_cache()
+    # New or replaced photo: render its thumbnails once it is committed
+    if instance.profile_picture and not variants_are_current(instance):
+        profile_id = instance.id
+        transaction.on_commit(lambda: variant_worker.submit(profile_id))
+
+
+@receiver(post_delete, sender=DoctorProfile)
+def unindex_doctor_profile(sender, instance, **kwargs):
+    search.remove_doctor_profile(instance.id)
+    invalidate_profile_cache()
+
+
+@receiver(post_save, sender=User)
+def reindex_doctor_user(sender, instance, created, update_fields=None, **kwargs):
+    # Username and email are shown on the public profile; the username is also searched
+    if update_fields is not None and not {'username', 'email'} & set(update_fields):
+        return
+    if not created and instance.role == 'doctor':
+        if update_fields is None or 'username' in update_fields:
+            search.index_doctor_profiles(list(DoctorProfile.objects.filter(user=instance).values_list('id', flat=True)))
+        invalidate_profile_cache()
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_state(sender, instance, created, update_fields=None, **kwargs):
+    # Password, activation, username or role may have changed; a login only touches last_login
+    if not created and update_fields != frozenset({'last_login'}):
+        invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def forget_user_state(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Notification)
+def publish_notification(sender, instance, created, **kwargs):
+    # Pushed to connected clients once the notification is committed
+    if created:
+        payload = notification_payload(instance)
+        transaction.on_commit(lambda: get_broker().publish(instance.recipient_id, payload))
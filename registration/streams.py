@@ -0,0 +1,88 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import ClaimsJWTAuthentication
+from .events import get_broker, notification_payload
+from .models import Notification
+
+
+def _access_token(request):
+    # EventSource cannot send headers, so the token may also come as ?token=
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[len('Bearer '):]
+    return request.GET.get('token')
+
+
+def _format_event(payload):
+    return f"id: {payload['id']}\nevent: notification\ndata: {json.dumps(payload)}\n\n"
+
+
+@sync_to_async
+def _missed_notifications(user_id, last_event_id):
+    notifications = Notification.objects.filter(recipient_id=user_id, id__gt=last_event_id).order_by('id')
+    return [notification_payload(notification) for notification in notifications[:100]]
+
+
+async def notification_stream(request):
+    """
+    Server-Sent Events stream of the user's new notifications.
+
+    The access token is checked like any API request's (active user, current
+    password) when the stream opens, and the stream ends when the token
+    expires, so the client reconnects with a fresh one. An open stream never
+    touches the database. A reconnecting client that sends Last-Event-ID
+    first receives what it missed. Needs an ASGI server.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Use GET to open the notification stream.'}, status=405)
+
+    raw_token = _access_token(request)
+    if not raw_token:
+        return JsonResponse({'error': 'A valid access token is required.'}, status=401)
+    authentication = ClaimsJWTAuthentication()
+    try:
+        token = authentication.get_validated_token(raw_token)
+        user = await sync_to_async(authentication.get_user)(token)
+    except AuthenticationFailed:
+        return JsonResponse({'error': 'A valid access token is required.'}, status=401)
+    user_id = user.pk
+    expires = token['exp']
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+
+    async def events():
+        broker = get_broker()
+        subscription = broker.subscribe(user_id)
+        try:
+            yield "retry: 5000\n\n"
+            if last_event_id and last_event_id.isdigit():
+                for payload in await _missed_notifications(user_id, int(last_event_id)):
+                    yield _format_event(payload)
+            while True:
+                remaining = expires - time.time()
+                if remaining <= 0:
+                    # The client reconnects (with Last-Event-ID) using a fresh token
+                    yield "event: token-expired\ndata: {}\n\n"
+                    return
+                try:
+                    payload = await asyncio.wait_for(subscription.queue.get(), timeout=min(heartbeat, remaining))
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield ": ping\n\n"
+                else:
+                    yield _format_event(payload)
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,3 +1,1603 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from smtplib import SMTPException, SMTPServerDisconnected
+from unittest import mock
+
+import joblib
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection, connections, OperationalError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .api.serializers import CustomTokenObtainPairSerializer
+from .authentication import ClaimsJWTAuthentication, user_states
+from .blacklist import FilteredRefreshToken, blacklist_filter
+from .disease_prediction import predict_batch
+from .events import get_broker
+from .idempotency import idempotent
+from .imports import AppointmentImporter
+from .model_registry import ModelRegistry, ModelUnavailable
+from .models import User, Appointment, AppointmentTokenCounter, Notification, DoctorProfile, EmailOutbox, IdempotencyKey
+from .outbox import claim_batch, deliver_batch, drain_outbox, outbox_stats, retry_delay
+from .pagination import decode_cursor, encode_cursor
+from .prediction_cache import PredictionCache
+from .retry import retry_on_lock
+from .routers import PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware, check_pin_cache
+from .search import FTS_TABLE, rebuild_index, search_doctor_profiles
+from .seeding import REFERENCE_DATE, Seeder
+from . import profile_cache
 
 # Create your tests here.
+
+# For tests slow by design (password hashing, lock waits, long-lived streams), which would flood the slow-request log
+quiet_slow_requests = override_settings(PERFORMANCE_SLOW_REQUEST_MS=60 * 1000)
+
+
+@quiet_slow_requests
+class AppointmentTokenConcurrencyTest(TransactionTestCase):
+    """
+    Book many slots for the same doctor and day from parallel threads and
+    check that the daily tokens come out unique and gap-free.
+    """
+    threads = 8
+    bookings_per_thread = 40
+
+    def setUp(self):
+        self.doctor = User.objects.create_user('token_doctor', 'token_doctor@example.com', 'password123', role='doctor')
+        self.patient = User.objects.create_user('token_patient', 'token_patient@example.com', 'password123', role='patient')
+        self.date = datetime.date(2030, 1, 1)
+
+    def book_slots(self, slots, errors):
+        try:
+            for minute in slots:
+                while True:
+                    try:
+                        Appointment.objects.create(
+                            doctor=self.doctor,
+                            patient=self.patient,
+                            date=self.date,
+                            time=datetime.time(minute // 60, minute % 60),
+                        )
+                        break
+                    except OperationalError as e:
+                        # SQLite gives up on busy locks; the booking itself must still succeed
+                        if 'locked' not in str(e):
+                            raise
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def test_parallel_bookings_get_unique_sequential_tokens(self):
+        total = self.threads * self.bookings_per_thread
+        errors = []
+        workers = [
+            threading.Thread(target=self.book_slots, args=(range(i, total, self.threads), errors))
+            for i in range(self.threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        tokens = sorted(
+            Appointment.objects.filter(doctor=self.doctor, date=self.date).values_list('token', flat=True)
+        )
+        self.assertEqual(tokens, list(range(1, total + 1)))
+        self.assertEqual(
+            AppointmentTokenCounter.objects.get(doctor=self.doctor, date=self.date).last_token, total
+        )
+
+    def test_failed_booking_does_not_leave_a_gap(self):
+        Appointment.objects.create(doctor=self.doctor, patient=self.patient, date=self.date, time=datetime.time(9, 0))
+        duplicate = Appointment(doctor=self.doctor, patient=self.patient, date=self.date, time=datetime.time(9, 0))
+        with self.assertRaises(Exception):
+            duplicate.save()
+        self.assertIsNone(duplicate.token)
+
+        appointment = Appointment.objects.create(
+            doctor=self.doctor, patient=self.patient, date=self.date, time=datetime.time(9, 15)
+        )
+        self.assertEqual(appointment.token, 2)
+
+
+class QueryPlanTest(TestCase):
+    """
+    The hot list queries must be answered from an index: no full table
+    scans and no temporary B-tree to sort the result.
+    """
+    tables = ('registration_appointment', 'registration_notification')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create_user('plan_doctor', 'plan_doctor@example.com', 'password123', role='doctor')
+        cls.patient = User.objects.create_user('plan_patient', 'plan_patient@example.com', 'password123', role='patient')
+        for day in range(1, 4):
+            Appointment.objects.create(
+                doctor=cls.doctor, patient=cls.patient, date=datetime.date(2030, 1, day), time=datetime.time(9, 0)
+            )
+            Notification.objects.create(
+                recipient=cls.patient, event_type='appointment_confirmed', subject='Confirmed', message='Confirmed'
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def assertIndexedPlans(self, queries):
+        checked = 0
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or not any(table in sql for table in self.tables):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plan = [row[-1] for row in cursor.fetchall()]
+            for step in plan:
+                self.assertNotRegex(step, r'^SCAN registration_', f"Full scan in plan {plan} for: {sql}")
+                self.assertNotIn('USE TEMP B-TREE', step, f"Sort without index in plan {plan} for: {sql}")
+            checked += 1
+        self.assertGreater(checked, 0)
+
+    def assertViewUsesIndexes(self, user, url):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIndexedPlans(context.captured_queries)
+        return response
+
+    def test_patient_appointment_list(self):
+        response = self.assertViewUsesIndexes(self.patient, '/api/appointments/patient/?page_size=1')
+        next_url = re.sub(r'^https?://[^/]+', '', response.json()['next'])
+        self.assertViewUsesIndexes(self.patient, next_url)
+        self.assertViewUsesIndexes(self.patient, '/api/appointments/patient/?status=pending&date_from=2030-01-02')
+
+    def test_doctor_appointment_lists(self):
+        response = self.assertViewUsesIndexes(self.doctor, '/api/appointments/doctor/?page_size=1')
+        next_url = re.sub(r'^https?://[^/]+', '', response.json()['next'])
+        self.assertViewUsesIndexes(self.doctor, next_url)
+        self.assertViewUsesIndexes(self.doctor, '/api/appointments/manage/?status=pending,confirmed')
+
+    def test_notification_list(self):
+        self.assertViewUsesIndexes(self.patient, '/api/notifications/')
+        self.assertViewUsesIndexes(self.patient, '/api/notifications/?since=1')
+        self.assertViewUsesIndexes(self.patient, '/api/notifications/unread-count/')
+
+    def test_unread_count(self):
+        with CaptureQueriesContext(connection) as context:
+            Notification.objects.filter(recipient=self.patient, is_read=False).count()
+        self.assertIndexedPlans(context.captured_queries)
+
+
+class QueryBudgetTest(TestCase):
+    """
+    Every endpoint runs a fixed number of queries however much data there
+    is; an N+1 regression blows the budget.
+    """
+    doctors = 500
+    appointments = 300
+
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password(None)
+        doctors = User.objects.bulk_create([
+            User(username=f'budget_doctor_{i}', email=f'budget_doctor_{i}@example.com', role='doctor', password=password)
+            for i in range(cls.doctors)
+        ])
+        DoctorProfile.objects.bulk_create([
+            DoctorProfile(
+                user=doctor, specialization='Cardiologist', profile_picture='doctor_profiles/doctor.jpg',
+                certificate_picture='doctor_certificates/doctor.jpg', license_number=str(i), phone='9800000000',
+            )
+            for i, doctor in enumerate(doctors)
+        ])
+        rebuild_index()
+
+        cls.doctor = doctors[0]
+        # Relative to today: availability leaves out past days
+        cls.first_day = timezone.localdate() + datetime.timedelta(days=30)
+        cls.busy_day = cls.first_day + datetime.timedelta(days=cls.appointments + 30)
+        cls.patient = User.objects.create_user('budget_patient', 'budget_patient@example.com', 'password123', role='patient')
+        Appointment.objects.bulk_create([
+            Appointment(
+                doctor=doctors[i % cls.doctors], patient=cls.patient, date=cls.first_day + datetime.timedelta(days=i),
+                time=datetime.time(9, 0), token=1, status='confirmed' if i % 2 else 'pending',
+            )
+            for i in range(cls.appointments)
+        ])
+        Appointment.objects.bulk_create([
+            Appointment(
+                doctor=cls.doctor, patient=cls.patient, date=cls.busy_day, time=datetime.time(8, i),
+                token=i + 1, status='pending',
+            )
+            for i in range(50)
+        ])
+        Notification.objects.bulk_create([
+            Notification(recipient=cls.patient, event_type='appointment_confirmed', subject='Confirmed', message='Confirmed')
+            for _ in range(cls.appointments)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def assertQueryBudget(self, budget, user, method, url, data=None, expected_status=200):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, expected_status, response.content)
+        queries = [query['sql'] for query in context.captured_queries if 'SAVEPOINT' not in query['sql']]
+        self.assertLessEqual(
+            len(queries), budget, f"{method.upper()} {url} ran {len(queries)} queries:\n" + "\n".join(queries)
+        )
+        return response
+
+    def test_doctor_directory(self):
+        response = self.assertQueryBudget(1, self.patient, 'get', '/api/doctors/')
+        self.assertEqual(len(response.json()), self.doctors)
+        self.assertQueryBudget(2, self.patient, 'get', '/api/doctors/?q=budget')
+        self.assertQueryBudget(2, self.patient, 'get', '/api/doctors/?name=budget_doctor&specialization=cardio')
+        self.assertQueryBudget(1, self.patient, 'get', f'/api/doctors/{self.doctor.id}/')
+
+        # Served from the profile cache
+        self.assertQueryBudget(0, self.patient, 'get', '/api/doctors/')
+        self.assertQueryBudget(0, self.patient, 'get', '/api/doctors/?q=budget')
+        self.assertQueryBudget(0, self.patient, 'get', f'/api/doctors/{self.doctor.id}/')
+
+    def test_doctor_availability(self):
+        url = f'/api/doctors/{self.doctor.id}/availability/'
+        start, end = self.first_day, self.first_day + datetime.timedelta(days=29)
+        response = self.assertQueryBudget(2, self.patient, 'get', f'{url}?start={start}&end={end}')
+        days = response.json()['days']
+        self.assertEqual(len(days), 30)
+        # 09:00-17:00 on a 15 minute grid, minus the 09:00 booking on the first day
+        self.assertEqual(len(days[0]['free']), 31)
+        self.assertEqual(days[0]['free'][0], '09:15:00')
+        self.assertEqual(len(days[1]['free']), 32)
+
+        end = start + datetime.timedelta(days=364)
+        self.assertQueryBudget(0, self.patient, 'get', f'{url}?start={start}&end={end}', expected_status=400)
+
+    def test_appointment_lists(self):
+        self.assertQueryBudget(1, self.patient, 'get', '/api/appointments/patient/?page_size=200')
+        self.assertQueryBudget(1, self.doctor, 'get', '/api/appointments/doctor/?page_size=200')
+        self.assertQueryBudget(1, self.doctor, 'get', '/api/appointments/manage/?page_size=200&status=pending')
+
+    def test_notification_list(self):
+        response = self.assertQueryBudget(2, self.patient, 'get', '/api/notifications/')
+        self.assertEqual(len(response.json()), self.appointments)
+
+        # Unchanged inbox: only the cheap state query runs
+        self.client.credentials(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertQueryBudget(1, self.patient, 'get', '/api/notifications/', expected_status=304)
+        self.client.credentials()
+
+        latest_id = response.json()[0]['id']
+        response = self.assertQueryBudget(2, self.patient, 'get', f'/api/notifications/?since={latest_id - 5}')
+        self.assertEqual([item['id'] for item in response.json()], list(range(latest_id, latest_id - 5, -1)))
+        self.assertQueryBudget(1, self.patient, 'get', '/api/notifications/unread-count/')
+
+    def test_mark_notifications_read(self):
+        ids = list(Notification.objects.filter(recipient=self.patient).values_list('id', flat=True)[:200])
+        self.assertQueryBudget(1, self.patient, 'patch', f'/api/notifications/read/{ids[0]}/')
+
+        response = self.assertQueryBudget(2, self.patient, 'patch', '/api/notifications/read/', {'ids': ids})
+        self.assertEqual(response.json(), {'updated': 199, 'unread_count': self.appointments - 200})
+
+        response = self.assertQueryBudget(2, self.patient, 'patch', '/api/notifications/read/', {'all': True})
+        self.assertEqual(response.json(), {'updated': self.appointments - 200, 'unread_count': 0})
+
+    def assertStreamedExport(self, user, url):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+            body = b''.join(response.streaming_content).decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(context.captured_queries), 1, [query['sql'] for query in context.captured_queries])
+        return body
+
+    def test_appointment_export(self):
+        body = self.assertStreamedExport(self.doctor, '/api/appointments/export/')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 51)
+        self.assertEqual(rows[0]['patient'], 'budget_patient')
+
+        body = self.assertStreamedExport(self.doctor, f'/api/appointments/export/?output=ndjson&date_from={self.busy_day}')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 50)
+        self.assertEqual(rows[0]['time'], '08:00:00')
+
+        admin = User.objects.create_user('budget_admin', 'budget_admin@example.com', 'password123', role='admin')
+        body = self.assertStreamedExport(admin, '/api/appointments/export/?output=ndjson&status=confirmed')
+        self.assertEqual(len(body.splitlines()), self.appointments // 2)
+
+        self.assertQueryBudget(0, self.patient, 'get', '/api/appointments/export/', expected_status=403)
+
+    def test_booking_and_status_changes(self):
+        response = self.assertQueryBudget(
+            7, self.patient, 'post', '/api/appointments/book/',
+            {'doctor_username': self.doctor.username, 'date': (self.busy_day + datetime.timedelta(days=1)).isoformat(), 'time': '10:00:00'},
+            expected_status=201,
+        )
+        appointment_id = response.json()['id']
+        self.assertQueryBudget(
+            4, self.doctor, 'patch', f'/api/appointments/manage/{appointment_id}/', {'status': 'confirmed'}
+        )
+        self.assertQueryBudget(4, self.patient, 'patch', f'/api/appointments/complete/{appointment_id}/')
+        self.assertEqual(Notification.objects.filter(recipient=self.doctor).latest('id').event_type, 'appointment_completed')
+        self.assertQueryBudget(
+            4, self.doctor, 'patch', f'/api/appointments/{appointment_id}/upload-prescription/',
+            {'prescription': 'Rest and fluids'},
+        )
+
+
+class DoctorProfileCacheTest(TestCase):
+    """
+    Public doctor profiles are cached until a profile or its user changes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create_user('cache_doctor', 'cache_doctor@example.com', 'password123', role='doctor')
+        cls.patient = User.objects.create_user('cache_patient', 'cache_patient@example.com', 'password123', role='patient')
+        DoctorProfile.objects.create(
+            user=cls.doctor, specialization='Cardiologist', profile_picture='doctor_profiles/doctor.jpg',
+            certificate_picture='doctor_certificates/doctor.jpg', license_number='1', phone='9800000000',
+            picture_variants={'source': 'doctor_profiles/doctor.jpg'},
+        )
+
+    def setUp(self):
+        cache.clear()
+        profile_cache.stats.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+        self.url = f'/api/doctors/{self.doctor.id}/'
+
+    def test_etag_and_hit_ratio(self):
+        response = self.client.get(self.url)
+        self.client.credentials(HTTP_IF_NONE_MATCH=response['ETag'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, 304)
+        self.assertEqual(self.client.get('/api/doctors/cache-stats/').json()['profile'], {
+            'hits': 1, 'misses': 1, 'hit_ratio': 0.5,
+        })
+
+    def test_profile_update_invalidates(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get('/api/doctors/').json()[0]['phone'], '9800000000')
+
+        self.client.force_authenticate(self.doctor)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch('/api/doctor/profile/', {'phone': '9811111111'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.client.force_authenticate(self.patient)
+        response = self.client.get(self.url)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['phone'], '9811111111')
+        self.assertEqual(self.client.get('/api/doctors/').json()[0]['phone'], '9811111111')
+
+    def test_username_change_invalidates(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.username = 'renamed_doctor'
+            self.doctor.save()
+        self.assertEqual(self.client.get(self.url).json()['user_username'], 'renamed_doctor')
+
+        # A login only touches last_login and keeps the cache
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.doctor.save(update_fields=['last_login'])
+        self.assertEqual(callbacks, [])
+
+
+class PictureVariantTest(TestCase):
+    """
+    Uploaded profile pictures get small JPEG and WebP variants.
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            PROFILE_PICTURE_SIZES={'small': 96, 'medium': 320},
+            PROFILE_PICTURE_VARIANTS_ASYNC=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+        self.doctor = User.objects.create_user('photo_doctor', 'photo_doctor@example.com', 'password123', role='doctor')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile = DoctorProfile.objects.create(
+                user=self.doctor, specialization='Cardiologist', profile_picture=self.photo('photo.jpg', 2000, 1500),
+                certificate_picture='doctor_certificates/doctor.jpg', license_number='1', phone='9800000000',
+            )
+        self.profile.refresh_from_db()
+
+    def photo(self, name, width, height):
+        output = io.BytesIO()
+        Image.new('RGB', (width, height), (200, 30, 30)).save(output, 'JPEG', quality=95)
+        return SimpleUploadedFile(name, output.getvalue(), content_type='image/jpeg')
+
+    def test_variants_are_created(self):
+        variants = self.profile.picture_variants
+        self.assertEqual(variants['source'], self.profile.profile_picture.name)
+        for size, edge in (('small', 96), ('medium', 320)):
+            for image_format, pil_format in (('jpeg', 'JPEG'), ('webp', 'WEBP')):
+                with default_storage.open(variants[size][image_format]) as variant:
+                    image = Image.open(variant)
+                    self.assertEqual((image.format, image.size), (pil_format, (edge, edge)))
+
+        client = APIClient()
+        client.force_authenticate(self.doctor)
+        data = client.get(f'/api/doctors/{self.doctor.id}/').json()
+        self.assertEqual(data['profile_thumbnail'], default_storage.url(variants['small']['jpeg']))
+        self.assertEqual(data['profile_picture_variants']['medium']['webp'], default_storage.url(variants['medium']['webp']))
+
+    def test_replaced_picture_gets_new_variants(self):
+        old_variants = self.profile.picture_variants
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.profile_picture = self.photo('new_photo.jpg', 800, 1200)
+            self.profile.save()
+        self.profile.refresh_from_db()
+
+        self.assertIn('new_photo', self.profile.picture_variants['small']['webp'])
+        self.assertFalse(default_storage.exists(old_variants['small']['webp']))
+
+
+class AppointmentImportTest(TestCase):
+    """
+    Bulk imports create appointments in chunks with a fixed number of
+    queries each, continue the daily tokens and report rejected rows.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create_user('import_doctor', 'import_doctor@example.com', 'password123', role='doctor')
+        cls.patient = User.objects.create_user('import_patient', 'import_patient@example.com', 'password123', role='patient')
+        cls.admin = User.objects.create_user('import_admin', 'import_admin@example.com', 'password123', role='admin')
+        cls.date = datetime.date(2030, 5, 1)
+        Appointment.objects.create(doctor=cls.doctor, patient=cls.patient, date=cls.date, time=datetime.time(8, 0))
+
+    def rows(self, count):
+        return [
+            {'doctor': 'import_doctor', 'patient': 'import_patient', 'date': self.date.isoformat(),
+             'time': f'{9 + minute // 60:02d}:{minute % 60:02d}', 'status': 'confirmed'}
+            for minute in range(count)
+        ]
+
+    def test_api_import(self):
+        rows = self.rows(100) + [
+            {'doctor': 'import_doctor', 'patient': 'import_patient', 'date': self.date.isoformat(), 'time': '08:00'},
+            {'doctor': 'import_doctor', 'patient': 'import_patient', 'date': self.date.isoformat(), 'time': '09:00'},
+            {'doctor': 'nobody', 'patient': 'import_patient', 'date': self.date.isoformat(), 'time': '12:00'},
+            {'doctor': 'import_doctor', 'patient': 'import_patient', 'date': 'tomorrow', 'time': '12:00'},
+        ]
+        body = ''.join(json.dumps(row) + '\n' for row in rows) + 'not json\n'
+        upload = SimpleUploadedFile('appointments.ndjson', body.encode())
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with override_settings(APPOINTMENT_IMPORT_CHUNK_SIZE=50), CaptureQueriesContext(connection) as context:
+            response = client.post('/api/appointments/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        self.assertEqual((data['created'], data['rejected']), (100, 5))
+        self.assertEqual(
+            sorted((rejection['line'], rejection['reason']) for rejection in data['rejections']),
+            [(101, 'This time slot is already booked.'), (102, 'This time slot is already booked.'),
+             (103, "Unknown doctor 'nobody'."), (104, 'Invalid date or time.'), (105, 'Malformed line.')],
+        )
+        queries = [query['sql'] for query in context.captured_queries if 'SAVEPOINT' not in query['sql']]
+        self.assertLessEqual(len(queries), 3 * 6, "\n".join(queries))
+
+        tokens = Appointment.objects.filter(doctor=self.doctor, date=self.date).order_by('time').values_list('token', flat=True)
+        self.assertEqual(list(tokens), list(range(1, 102)))
+        self.assertEqual(AppointmentTokenCounter.objects.get(doctor=self.doctor, date=self.date).last_token, 101)
+
+        client.force_authenticate(self.doctor)
+        response = client.post('/api/appointments/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 403)
+
+    def test_conflicts_checked_on_exact_days(self):
+        later, last = self.date + datetime.timedelta(days=365), self.date + datetime.timedelta(days=366)
+        Appointment.objects.bulk_create([
+            Appointment(doctor=self.doctor, patient=self.patient, date=self.date + datetime.timedelta(days=day), time=datetime.time(8, 0), token=1)
+            for day in range(1, 367)
+        ])
+        candidates = [(line, {}, self.doctor.id, self.patient.id, {'date': date}) for line, date in enumerate((self.date, later, last))]
+
+        # Only the file's days are loaded, not the year of bookings between them...
+        expected = {(self.doctor.id, date, datetime.time(8, 0)) for date in (self.date, later, last)}
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(AppointmentImporter().existing_slots(candidates), expected)
+        self.assertEqual(len(context.captured_queries), 1)
+        # ...in batches that stay under the parameter limit
+        with mock.patch.object(connection.features, 'max_query_params', 4), CaptureQueriesContext(connection) as context:
+            self.assertEqual(AppointmentImporter().existing_slots(candidates), expected)
+        self.assertEqual(len(context.captured_queries), 2)
+
+        rows = [
+            {'doctor': 'import_doctor', 'patient': 'import_patient', 'date': date.isoformat(), 'time': time}
+            for date, time in ((self.date, '08:00'), (self.date, '08:15'), (later, '08:00'), (later, '09:00'))
+        ]
+        result = AppointmentImporter().run(enumerate(rows, start=1))
+        self.assertEqual((result.created, [rejection['line'] for rejection in result.rejected]), (2, [1, 3]))
+
+    def test_command_with_report(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path, report = f'{directory}/appointments.csv', f'{directory}/rejected.csv'
+        with open(path, 'w', newline='') as handle:
+            writer = csv.DictWriter(handle, ['doctor', 'patient', 'date', 'time', 'status'])
+            writer.writeheader()
+            writer.writerows(self.rows(10) + [{'doctor': 'import_patient', 'patient': 'import_patient',
+                                               'date': self.date.isoformat(), 'time': '15:00', 'status': ''}])
+
+        call_command('import_appointments', path, '--dry-run', stdout=io.StringIO())
+        self.assertEqual(Appointment.objects.count(), 1)
+
+        call_command('import_appointments', path, '--report', report, stdout=io.StringIO())
+        self.assertEqual(Appointment.objects.filter(status='confirmed').count(), 10)
+        with open(report, newline='') as handle:
+            rejected = list(csv.DictReader(handle))
+        self.assertEqual([(row['line'], row['reason']) for row in rejected], [('12', "Unknown doctor 'import_patient'.")])
+
+
+@override_settings(PROFILE_PICTURE_SIZES={'small': 16})
+class SeederTest(TestCase):
+    """
+    The synthetic dataset is deterministic and its tokens and counters agree.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_seed(self):
+        doctor_ids, patient_ids = Seeder(seed=7, chunk_size=16, prefix='a').run(4, 10, 150, notifications=75)
+        self.assertEqual((len(doctor_ids), len(patient_ids)), (4, 10))
+        self.assertEqual(Appointment.objects.count(), 150)
+        self.assertEqual(Notification.objects.count(), 75)
+
+        for counter in AppointmentTokenCounter.objects.all():
+            tokens = Appointment.objects.filter(doctor_id=counter.doctor_id, date=counter.date).order_by('time')
+            self.assertEqual(list(tokens.values_list('token', flat=True)), list(range(1, counter.last_token + 1)))
+
+        Seeder(seed=7, chunk_size=50, prefix='b').run(4, 10, 150)
+        schedule = lambda prefix: [
+            (username.split('_', 1)[1], date, time, token, status)
+            for username, date, time, token, status in Appointment.objects.filter(
+                doctor__username__startswith=prefix
+            ).order_by('doctor_id', 'date', 'time').values_list('doctor__username', 'date', 'time', 'token', 'status')
+        ]
+        self.assertEqual(schedule('a_'), schedule('b_'))
+
+        # Past and future are relative to the fixed reference date, not today
+        past = Appointment.objects.filter(date__lt=REFERENCE_DATE)
+        self.assertFalse(past.exclude(status__in=('completed', 'canceled')).exists())
+        self.assertFalse(Appointment.objects.filter(date__gte=REFERENCE_DATE, status__in=('completed', 'canceled')).exists())
+        event_types = {event_type for event_type, _ in Notification.EVENT_CHOICES}
+        self.assertTrue(set(Notification.objects.values_list('event_type', flat=True)) <= event_types)
+
+
+class PerformanceMiddlewareTest(TestCase):
+    """
+    Every response reports its database time, query count and named
+    sections in Server-Timing; slow ones are logged with their queries.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user('timing_patient', 'timing_patient@example.com', 'password123', role='patient')
+        Notification.objects.create(recipient=cls.patient, event_type='appointment_confirmed', subject='Hi', message='Hi')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def timings(self, response):
+        return {entry.split(';')[0]: entry for entry in response['Server-Timing'].split(', ')}
+
+    def test_server_timing(self):
+        timings = self.timings(self.client.get('/api/notifications/'))
+        self.assertIn('desc="2 queries"', timings['db'])
+        self.assertIn('render', timings)
+        self.assertIn('total', timings)
+
+        timings = self.timings(self.client.get('/api/appointments/patient/'))
+        self.assertIn('desc="1 queries"', timings['db'])
+        self.assertIn('serialize', timings)
+
+    @override_settings(PERFORMANCE_SLOW_REQUEST_MS=0, PERFORMANCE_SLOW_REQUEST_QUERIES=1)
+    def test_slow_request_log(self):
+        with self.assertLogs('registration.performance', 'WARNING') as logs:
+            self.client.get('/api/notifications/')
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('Slow request GET /api/notifications/: 200', logs.output[0])
+        # Only the slowest query is listed
+        self.assertEqual(logs.output[0].count(' ms: SELECT'), 1)
+
+    @override_settings(PERFORMANCE_SLOW_REQUEST_MS=0, PERFORMANCE_SLOW_LOG_SAMPLE_RATE=0)
+    def test_slow_request_log_is_sampled(self):
+        with self.assertNoLogs('registration.performance', 'WARNING'):
+            self.client.get('/api/notifications/')
+
+
+@quiet_slow_requests
+class ClaimsAuthenticationTest(TestCase):
+    """
+    Login tokens carry the user's claims, so an authenticated request needs
+    no user query once the user's state is cached, and still stops working
+    after a password change or deactivation.
+    """
+
+    def setUp(self):
+        user_states.clear()
+        self.patient = User.objects.create_user('claims_patient', 'claims_patient@example.com', 'password123', role='patient')
+        self.client = APIClient()
+
+    def login(self, password='password123'):
+        response = self.client.post('/api/login/', {'username': 'claims_patient', 'password': password}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return response.data
+
+    def test_no_user_query_once_cached(self):
+        self.login()
+        with self.assertNumQueries(3):  # user state, notifications, unread count
+            self.assertEqual(self.client.get('/api/notifications/').status_code, 200)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get('/api/notifications/').status_code, 200)
+
+    def test_claims_user(self):
+        authentication = ClaimsJWTAuthentication()
+        user = authentication.get_user(authentication.get_validated_token(self.login()['access']))
+        self.assertEqual((user.pk, user.username, user.role, user.is_active), (self.patient.pk, 'claims_patient', 'patient', True))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'claims_patient@example.com')
+
+    def test_password_change_revokes_tokens(self):
+        self.login()
+        response = self.client.post(
+            '/api/password-change/', {'current_password': 'password123', 'new_password': 'new-password-456'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/notifications/').status_code, 401)
+
+        self.login('new-password-456')
+        self.assertEqual(self.client.get('/api/notifications/').status_code, 200)
+
+    def test_deactivation_revokes_tokens(self):
+        self.login()
+        self.assertEqual(self.client.get('/api/notifications/').status_code, 200)
+        self.patient.is_active = False
+        self.patient.save()
+        self.assertEqual(self.client.get('/api/notifications/').status_code, 401)
+
+    def test_tokens_without_claims(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.patient)}')
+        self.assertEqual(self.client.get('/api/notifications/').status_code, 200)
+
+
+@quiet_slow_requests
+class TokenBlacklistTest(TestCase):
+    """
+    Refresh tokens are checked against the in-process blacklist filter, and
+    expired tokens are pruned in chunks.
+    """
+
+    def setUp(self):
+        blacklist_filter.reset()
+        user_states.clear()  # User ids are reused between tests
+        self.patient = User.objects.create_user('blacklist_patient', 'blacklist_patient@example.com', 'password123', role='patient')
+        self.client = APIClient()
+        response = self.client.post('/api/login/', {'username': 'blacklist_patient', 'password': 'password123'}, format='json')
+        self.tokens = response.data
+
+    def refresh(self):
+        return self.client.post('/api/token/refresh/', {'refresh': self.tokens['refresh']}, format='json')
+
+    def test_refresh_checks_filter(self):
+        self.assertEqual(self.refresh().status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.refresh().status_code, 200)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/logout/', {'refresh_token': self.tokens['refresh']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.refresh().status_code, 401)
+
+    @override_settings(TOKEN_BLACKLIST_REFRESH_INTERVAL=0)
+    def test_filter_picks_up_other_processes(self):
+        self.assertEqual(self.refresh().status_code, 200)
+        # As if blacklisted elsewhere: the filter only learns it from the table
+        FilteredRefreshToken(self.tokens['refresh']).blacklist()
+        self.assertEqual(self.refresh().status_code, 401)
+        self.assertEqual(len(blacklist_filter), 1)
+
+    def test_prune_tokens(self):
+        expired = timezone.now() - datetime.timedelta(days=2)
+        for i in range(5):
+            token = OutstandingToken.objects.create(user=self.patient, jti=f'expired-{i}', token='x', expires_at=expired)
+            if i % 2:
+                BlacklistedToken.objects.create(token=token)
+        output = io.StringIO()
+        call_command('prune_tokens', chunk_size=2, stdout=output)
+
+        self.assertIn('Deleted 5 outstanding and 2 blacklisted tokens in 3 chunks', output.getvalue())
+        # The login's own token has not expired
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertEqual(BlacklistedToken.objects.count(), 0)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_PIN_SECONDS=5)
+class ReplicaRouterTest(SimpleTestCase):
+    """
+    Safe requests read from a replica unless the client wrote recently;
+    everything else, and everything without replicas, uses the primary.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+        self.user = User(id=4242, username='replica_patient', role='patient')
+
+    def read_db(self, request):
+        alias = []
+        middleware = ReplicaRoutingMiddleware(lambda request: alias.append(self.router.db_for_read(User)) or HttpResponse())
+        response = middleware(request)
+        return alias[0], response
+
+    def test_routing(self):
+        self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertEqual(self.read_db(self.factory.get('/api/doctors/'))[0], 'replica1')
+        self.assertEqual(self.read_db(self.factory.post('/api/appointments/book/'))[0], 'default')
+        self.assertEqual(self.router.db_for_write(User), 'default')
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.read_db(self.factory.get('/api/doctors/'))[0], 'default')
+
+    def test_read_your_writes(self):
+        request = self.factory.patch('/api/notifications/read/')
+        request.user = self.user  # As DRF sets it once authenticated
+        response = self.read_db(request)[1]
+
+        # Browsers send the cookie back...
+        request = self.factory.get('/api/notifications/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.assertEqual(self.read_db(request)[0], 'default')
+
+        # ...API clients are recognised once authenticated
+        request = self.factory.get('/api/notifications/')
+        request.user = self.user
+        self.assertEqual(self.read_db(request)[0], 'default')
+        request = self.factory.get('/api/notifications/')
+        request.user = User(id=4243, username='other_patient', role='patient')
+        self.assertEqual(self.read_db(request)[0], 'replica1')
+
+        cache.clear()  # The pin expired
+        request = self.factory.get('/api/notifications/')
+        request.user = self.user
+        self.assertEqual(self.read_db(request)[0], 'replica1')
+
+
+    def test_pin_cache_check(self):
+        self.assertEqual([error.id for error in check_pin_cache(None)], ['registration.E001'])
+        file_cache = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/pins'}
+        with override_settings(CACHES={**settings.CACHES, 'pins': file_cache}, REPLICA_PIN_CACHE='pins'):
+            self.assertEqual(check_pin_cache(None), [])
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(check_pin_cache(None), [])
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_PIN_SECONDS=5)
+class ReplicaDatabaseTest(TransactionTestCase):
+    """
+    Queries really reach the replica database, and a pinned client reads its write back from the primary.
+    """
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # A second SQLite database, known only to this test
+        default = connections['default']
+        replica = default.__class__({**default.settings_dict, 'NAME': f'{directory}/replica.sqlite3'}, 'replica1')
+        connections['replica1'] = replica
+        self.addCleanup(connections.__delitem__, 'replica1')
+        self.addCleanup(replica.close)
+        with replica.schema_editor() as editor:
+            editor.create_model(User)
+
+        # The replica lags: it has not seen the rename yet
+        self.user = User.objects.create_user('renamed_patient', 'replica@example.com', 'password123', role='patient')
+        User.objects.using('replica1').bulk_create([
+            User(id=self.user.pk, username='old_patient', email='replica@example.com', role='patient'),
+        ])
+        self.factory = RequestFactory()
+
+    def username(self, request):
+        usernames = []
+        middleware = ReplicaRoutingMiddleware(
+            lambda request: usernames.append(User.objects.get(pk=self.user.pk).username) or HttpResponse()
+        )
+        response = middleware(request)
+        return usernames[0], response
+
+    def test_reads(self):
+        self.assertEqual(self.username(self.factory.get('/api/profile/'))[0], 'old_patient')
+        self.assertEqual(self.username(self.factory.head('/api/profile/'))[0], 'old_patient')
+        self.assertEqual(self.username(self.factory.put('/api/profile/'))[0], 'renamed_patient')
+        self.assertEqual(User.objects.get(pk=self.user.pk).username, 'renamed_patient')  # Outside requests
+
+        request = self.factory.patch('/api/profile/')
+        request.user = self.user
+        response = self.username(request)[1]
+        request = self.factory.get('/api/profile/')
+        request.user = self.user
+        self.assertEqual(self.username(request)[0], 'renamed_patient')
+        request = self.factory.get('/api/profile/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.assertEqual(self.username(request)[0], 'renamed_patient')
+
+
+@override_settings(SQLITE_LOCK_RETRIES=2, SQLITE_LOCK_RETRY_DELAY=0)
+class RetryOnLockTest(TransactionTestCase):
+    """
+    Write views rerun, each time in a fresh transaction, while SQLite reports the database locked.
+    """
+
+    def view(self, errors):
+        calls = []
+
+        class View:
+            @retry_on_lock
+            def post(self, request):
+                calls.append(connection.in_atomic_block)
+                if len(calls) <= len(errors):
+                    raise errors[len(calls) - 1]
+                return 'done'
+
+        return View(), calls
+
+    def test_retries_lock_errors(self):
+        view, calls = self.view([OperationalError('database is locked')] * 2)
+        self.assertEqual(view.post(None), 'done')
+        self.assertEqual(calls, [True, True, True])
+
+    def test_gives_up(self):
+        view, calls = self.view([OperationalError('database is locked')] * 3)
+        with self.assertRaises(OperationalError):
+            view.post(None)
+        self.assertEqual(len(calls), 3)
+
+        view, calls = self.view([OperationalError('no such table: registration_user')])
+        with self.assertRaises(OperationalError):
+            view.post(None)
+        self.assertEqual(len(calls), 1)
+
+
+class IdempotencyKeyTest(TestCase):
+    """
+    Retries sent with the same Idempotency-Key get the first response back
+    without the view running again.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = User.objects.create_user('idem_doctor', 'idem_doctor@example.com', 'password123', role='doctor')
+        cls.patient = User.objects.create_user('idem_patient', 'idem_patient@example.com', 'password123', role='patient')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+        self.booking = {'doctor_username': 'idem_doctor', 'date': '2031-05-01', 'time': '10:00:00'}
+
+    def book(self, key, data=None):
+        return self.client.post('/api/appointments/book/', data or self.booking, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retried_booking_is_replayed(self):
+        first = self.book('booking-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', first)
+
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.book('booking-1')
+        # Only the key is looked at
+        self.assertEqual([query['sql'] for query in queries if 'registration_appointment' in query['sql']], [])
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Appointment.objects.filter(patient=self.patient).count(), 1)
+        self.assertEqual(Notification.objects.filter(recipient=self.doctor).count(), 1)
+
+        # Without a key a repeat is a new request
+        self.assertEqual(self.client.post('/api/appointments/book/', self.booking, format='json').status_code, 400)
+
+    def test_key_reused_for_another_request(self):
+        self.assertEqual(self.book('booking-1').status_code, 201)
+        response = self.book('booking-1', dict(self.booking, time='10:15:00'))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Appointment.objects.filter(patient=self.patient).count(), 1)
+
+    def test_status_change_and_expiry(self):
+        appointment = Appointment.objects.create(doctor=self.doctor, patient=self.patient, date=datetime.date(2031, 5, 2), time=datetime.time(9, 0))
+        self.client.force_authenticate(self.doctor)
+        confirm = lambda: self.client.patch(
+            f'/api/appointments/manage/{appointment.id}/', {'status': 'confirmed'}, format='json', HTTP_IDEMPOTENCY_KEY='confirm-1'
+        )
+        self.assertEqual(confirm().status_code, 200)
+        retry = confirm()
+        self.assertEqual((retry.status_code, retry['Idempotent-Replayed']), (200, 'true'))
+        self.assertEqual(Notification.objects.filter(recipient=self.patient).count(), 1)
+
+        # Once expired the key is new again, and the view runs
+        IdempotencyKey.objects.update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        retry = confirm()
+        self.assertEqual(retry.status_code, 400)
+        self.assertNotIn('Idempotent-Replayed', retry)
+
+        call_command('prune_idempotency_keys', stdout=io.StringIO())
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+
+    def test_uploads_are_fingerprinted_by_content(self):
+        class UploadView(APIView):
+            @idempotent
+            def post(self, request):
+                upload = request.data['report']
+                return Response({'name': upload.name, 'content': upload.read().decode()}, status=201)
+
+        factory = APIRequestFactory()
+
+        def upload(content, notes=('fasting',)):
+            request = factory.post(
+                '/api/reports/', {'report': SimpleUploadedFile('report.txt', content), 'note': list(notes)},
+                format='multipart', HTTP_IDEMPOTENCY_KEY='report-1',
+            )
+            force_authenticate(request, self.patient)
+            return UploadView.as_view()(request)
+
+        first = upload(b'Glucose 5.1 mmol/L')
+        # Hashing the upload leaves it for the view to read
+        self.assertEqual((first.status_code, first.data['content']), (201, 'Glucose 5.1 mmol/L'))
+        retry = upload(b'Glucose 5.1 mmol/L')
+        self.assertEqual((retry.status_code, retry['Idempotent-Replayed']), (201, 'true'))
+        # Same file name, other content; same file, other repeated fields
+        self.assertEqual(upload(b'Glucose 9.8 mmol/L').status_code, 422)
+        self.assertEqual(upload(b'Glucose 5.1 mmol/L', notes=('fasting', 'repeat')).status_code, 422)
+
+
+@quiet_slow_requests
+@override_settings(SQLITE_LOCK_RETRIES=20)
+class ConcurrentIdempotencyKeyTest(TransactionTestCase):
+    """
+    Duplicates sent at the same time wait for the first request instead of racing it.
+    """
+
+    def test_concurrent_duplicates(self):
+        User.objects.create_user('idem_doctor', 'idem_doctor@example.com', 'password123', role='doctor')
+        patient = User.objects.create_user('idem_patient', 'idem_patient@example.com', 'password123', role='patient')
+        responses, barrier = [], threading.Barrier(4)
+
+        def book():
+            try:
+                client = APIClient()
+                client.force_authenticate(patient)
+                barrier.wait()
+                responses.append(client.post(
+                    '/api/appointments/book/', {'doctor_username': 'idem_doctor', 'date': '2031-05-01', 'time': '10:00:00'},
+                    format='json', HTTP_IDEMPOTENCY_KEY='booking-1',
+                ))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([response.status_code for response in responses], [201] * 4)
+        self.assertEqual(sum(response.has_header('Idempotent-Replayed') for response in responses), 3)
+        self.assertEqual(len({response.json()['id'] for response in responses}), 1)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+
+@quiet_slow_requests
+@override_settings(NOTIFICATION_BROKER='registration.events.InProcessBroker', NOTIFICATION_STREAM_HEARTBEAT=60)
+class NotificationStreamTest(TestCase):
+    """
+    The notification stream checks its token like the API does, replays
+    what a reconnecting client missed, delivers published events and ends
+    when the token expires.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user('stream_patient', 'stream_patient@example.com', 'password123', role='patient')
+
+    def setUp(self):
+        user_states.clear()
+
+    def token(self, user=None, lifetime=None):
+        token = CustomTokenObtainPairSerializer.get_token(user or self.patient).access_token
+        if lifetime:
+            token.set_exp(lifetime=lifetime)
+        return str(token)
+
+    async def open(self, token=None, **headers):
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        return await self.async_client.get('/api/notifications/stream/', headers=headers)
+
+    async def read(self, response):
+        chunk = await anext(response.streaming_content)
+        return chunk.decode() if isinstance(chunk, bytes) else chunk
+
+    async def test_rejects_bad_tokens(self):
+        self.assertEqual((await self.open()).status_code, 401)
+        self.assertEqual((await self.open('not-a-token')).status_code, 401)
+
+        old_token = await sync_to_async(self.token)()
+        self.patient.set_password('new-password-456')
+        await sync_to_async(self.patient.save)()
+        self.assertEqual((await self.open(old_token)).status_code, 401)
+
+        self.patient.is_active = False
+        await sync_to_async(self.patient.save)()
+        self.assertEqual((await self.open(await sync_to_async(self.token)())).status_code, 401)
+
+    async def test_replays_missed_notifications(self):
+        notifications = [
+            await Notification.objects.acreate(recipient=self.patient, event_type='appointment_confirmed', subject=f'N{i}', message='m')
+            for i in range(3)
+        ]
+        response = await self.open(await sync_to_async(self.token)(), **{'Last-Event-ID': str(notifications[0].id)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(await self.read(response), 'retry: 5000\n\n')
+        for notification in notifications[1:]:
+            self.assertTrue((await self.read(response)).startswith(f'id: {notification.id}\nevent: notification\n'))
+        await response.streaming_content.aclose()
+
+    async def test_delivers_published_events_until_expiry(self):
+        response = await self.open(await sync_to_async(self.token)(lifetime=datetime.timedelta(seconds=2)))
+        self.assertEqual(await self.read(response), 'retry: 5000\n\n')  # Subscribed from here on
+
+        payload = {'id': 99, 'event_type': 'appointment_confirmed', 'subject': 'Hi', 'message': 'Hi',
+                   'is_read': False, 'created_at': '2030-01-01T00:00:00+00:00'}
+        get_broker().publish(self.patient.pk, payload)
+        self.assertEqual(await self.read(response), f'id: 99\nevent: notification\ndata: {json.dumps(payload)}\n\n')
+
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual([chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in chunks][-1],
+                         'event: token-expired\ndata: {}\n\n')
+        self.assertEqual(get_broker().connection_count(), 0)
+
+
+class FlakyEmailBackend(BaseEmailBackend):
+    """
+    Delivers to `mail.outbox` like the locmem backend, except to the `failing` recipients;
+    `unreachable` makes every send and reconnect fail.
+    """
+
+    def __init__(self, failing=(), unreachable=False, **kwargs):
+        super().__init__(**kwargs)
+        self.failing = set(failing)
+        self.unreachable = unreachable
+        self.calls = []
+
+    def open(self):
+        self.calls.append('open')
+        if self.unreachable:
+            raise SMTPException('Connection refused')
+
+    def close(self):
+        self.calls.append('close')
+
+    def send_messages(self, messages):
+        for message in messages:
+            if self.unreachable or message.to[0] in self.failing:
+                raise SMTPServerDisconnected(f'Lost the server sending to {message.to[0]}')
+            mail.outbox.append(message)
+        return len(messages)
+
+
+@override_settings(
+    OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_BASE_SECONDS=30, OUTBOX_RETRY_MAX_SECONDS=3600, OUTBOX_LEASE_SECONDS=300,
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class EmailOutboxTest(TestCase):
+    """
+    Workers claim due emails under a lease, back off exponentially after
+    failures and give up after OUTBOX_MAX_ATTEMPTS.
+    """
+
+    def enqueue(self, recipient, delay=-60, **fields):
+        return EmailOutbox.objects.create(
+            recipient_email=recipient, subject='Appointment', message='See you soon.',
+            next_attempt_at=timezone.now() + datetime.timedelta(seconds=delay), **fields
+        )
+
+    def test_claim_batch(self):
+        first, second, third = (self.enqueue(f'{name}@example.com', delay) for name, delay in (('a', -30), ('b', -20), ('c', -10)))
+        self.enqueue('later@example.com', delay=60)
+        self.enqueue('sent@example.com', status='sent')
+
+        before = timezone.now()
+        self.assertEqual(claim_batch(2), [first, second])
+        # Leased: other workers skip them until the lease runs out
+        for entry in EmailOutbox.objects.filter(pk__in=[first.pk, second.pk]):
+            self.assertGreaterEqual(entry.next_attempt_at, before + datetime.timedelta(seconds=300))
+        self.assertEqual(claim_batch(10), [third])
+        self.assertEqual(claim_batch(10), [])
+
+        with mock.patch.object(timezone, 'now', return_value=before + datetime.timedelta(seconds=301)):
+            self.assertEqual(
+                [entry.recipient_email for entry in claim_batch(10)],
+                ['later@example.com', 'a@example.com', 'b@example.com', 'c@example.com'],
+            )
+
+    def test_retry_delay(self):
+        self.assertEqual(
+            [retry_delay(attempts).total_seconds() for attempts in range(1, 9)],
+            [30, 60, 120, 240, 480, 960, 1920, 3600],
+        )
+
+    def test_failures_back_off_then_fail(self):
+        entries = [self.enqueue(f'{name}@example.com') for name in 'abc']
+        backend = FlakyEmailBackend(failing={'b@example.com'})
+        before = timezone.now()
+        self.assertEqual(deliver_batch(entries, backend), (2, 1))
+        # The session is reopened once after the failure and the batch goes on
+        self.assertEqual(backend.calls, ['close', 'open'])
+        self.assertEqual([message.to for message in mail.outbox], [['a@example.com'], ['c@example.com']])
+
+        failed = EmailOutbox.objects.get(recipient_email='b@example.com')
+        self.assertEqual((failed.status, failed.attempts), ('pending', 1))
+        self.assertIn('Lost the server', failed.last_error)
+        self.assertGreaterEqual(failed.next_attempt_at, before + datetime.timedelta(seconds=30))
+        self.assertEqual(EmailOutbox.objects.filter(status='sent').count(), 2)
+
+        self.assertEqual(deliver_batch([failed], backend), (0, 1))
+        failed.refresh_from_db()
+        self.assertEqual((failed.status, failed.attempts), ('failed', 2))
+
+    def test_unreachable_server(self):
+        entries = [self.enqueue(f'{name}@example.com') for name in 'abc']
+        backend = FlakyEmailBackend(unreachable=True)
+        self.assertEqual(deliver_batch(entries, backend), (0, 3))
+        self.assertEqual(backend.calls, ['close', 'open'])  # No reconnect per email
+        self.assertEqual(
+            list(EmailOutbox.objects.order_by('id').values_list('status', 'attempts', 'last_error')),
+            [('pending', 1, 'Lost the server sending to a@example.com')] + [('pending', 1, 'Connection refused')] * 2,
+        )
+
+    def test_drain_and_stats(self):
+        for name in 'abc':
+            self.enqueue(f'{name}@example.com')
+        self.enqueue('later@example.com', delay=60)
+        self.enqueue('retrying@example.com', delay=60, attempts=1)
+        self.enqueue('failed@example.com', status='failed', attempts=2)
+        EmailOutbox.objects.filter(recipient_email='a@example.com').update(
+            created_at=timezone.now() - datetime.timedelta(minutes=10)
+        )
+
+        stats = outbox_stats()
+        self.assertGreaterEqual(stats.pop('oldest_pending_age_seconds'), 600)
+        self.assertEqual(stats, {'due': 3, 'scheduled': 2, 'retrying': 1, 'failed': 1, 'sent': 0})
+
+        self.assertEqual(drain_outbox(batch_size=2), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        stats = outbox_stats()
+        self.assertLess(stats.pop('oldest_pending_age_seconds'), 600)
+        self.assertEqual(stats, {'due': 0, 'scheduled': 2, 'retrying': 1, 'failed': 1, 'sent': 3})
+
+
+class FixedModel:
+    """
+    Stands in for the random forest: predicts `disease` for every row and records the batch sizes it saw.
+    """
+
+    def __init__(self, disease):
+        self.disease = disease
+        self.batches = []
+
+    def predict(self, matrix):
+        self.batches.append(len(matrix))
+        return [self.disease] * len(matrix)
+
+
+class ModelFileMixin:
+    """
+    Serves FixedModel artifacts from a temporary file through a registry that checks it on every call.
+    """
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = Path(directory) / 'model.pkl'
+        self.registry = ModelRegistry(path=self.path, check_interval=0)
+        self.deployed = 0
+
+    def deploy(self, disease):
+        # Atomic rename, as in production; the explicit mtime makes each deploy visible
+        joblib.dump(FixedModel(disease), f'{self.path}.new')
+        os.replace(f'{self.path}.new', self.path)
+        self.deployed += 1
+        mtime_ns = time.time_ns() + self.deployed * 10 ** 9
+        os.utime(self.path, ns=(mtime_ns, mtime_ns))
+
+
+class PredictionCacheTest(ModelFileMixin, SimpleTestCase):
+    """
+    Symptom sets are cached as bitmasks in a bounded LRU that is emptied when another model version is loaded.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.cache = PredictionCache(max_size=2, ttl=60)
+        patcher = mock.patch('registration.disease_prediction.prediction_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.deploy(15)
+        self.loaded = self.registry.get()
+
+    def predict(self, *symptom_lists):
+        return [result['predicted_disease'] for result in predict_batch(list(symptom_lists), self.registry.get())]
+
+    def test_hits_and_misses(self):
+        # Order, duplicates and unknown symptoms don't change the bitmask
+        self.assertEqual(
+            self.predict(['itching', 'skin_rash'], ['skin_rash', 'itching', 'itching', 'unheard_of'], ['cough']),
+            ['Fungal infection'] * 3,
+        )
+        self.assertEqual(self.loaded.model.batches, [2])
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+        self.assertEqual(self.predict(['cough'], ['skin_rash', 'itching']), ['Fungal infection'] * 2)
+        self.assertEqual(self.loaded.model.batches, [2])  # No model call
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+        self.assertEqual(self.cache.stats()['hit_ratio'], 0.5)
+
+    def test_eviction_at_cap(self):
+        self.predict(['itching'])
+        self.predict(['cough'])
+        self.predict(['itching'])  # Now the most recently used
+        self.predict(['headache'])  # Over the cap: evicts cough
+        self.assertEqual((self.cache.stats()['size'], self.cache.evictions), (2, 1))
+
+        self.predict(['itching'], ['headache'])
+        self.assertEqual(self.loaded.model.batches, [1, 1, 1])
+        self.predict(['cough'])
+        self.assertEqual(self.loaded.model.batches, [1, 1, 1, 1])
+
+    def test_invalidated_by_model_reload(self):
+        self.assertEqual(self.predict(['itching']), ['Fungal infection'])
+        self.deploy(4)
+        self.assertEqual(self.predict(['itching']), ['Allergy'])
+        stats = self.cache.stats()
+        self.assertEqual((stats['size'], stats['invalidations'], stats['misses']), (1, 1, 2))
+        self.assertEqual(stats['model_version'], self.registry.get().version)
+        self.assertNotEqual(stats['model_version'], self.loaded.version)
+
+    def test_stats_for_admins_only(self):
+        self.predict(['itching'])
+        client = APIClient()
+        self.assertEqual(client.get('/api/predict/cache-stats/').status_code, 401)
+        client.force_authenticate(User(id=4301, username='stats_patient', role='patient'))
+        self.assertEqual(client.get('/api/predict/cache-stats/').status_code, 403)
+        for admin in (User(id=4302, username='stats_admin', role='admin'), User(id=4303, username='stats_staff', role='doctor', is_staff=True)):
+            client.force_authenticate(admin)
+            response = client.get('/api/predict/cache-stats/')
+            self.assertEqual((response.status_code, response.json()['model_version']), (200, self.loaded.version))
+
+
+class DoctorSearchTest(TestCase):
+    """
+    Doctor search matches word prefixes, ranks name hits above specialization and address
+    hits, and its index follows profile saves, username changes and deletes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profiles = {}
+        for username, specialization, address in [
+            ('john_smith', 'Cardiologist', 'Lakeside, Pokhara'),
+            ('johanna_karki', 'Dermatologist', 'Thamel, Kathmandu'),
+            ('ram_cardona', 'Neurologist', 'Baneshwor, Kathmandu'),
+            ('sita_rai', 'Pediatrician', 'Cardiff Road, Biratnagar'),
+        ]:
+            user = User.objects.create_user(username, f'{username}@example.com', 'password123', role='doctor')
+            cls.profiles[username] = DoctorProfile.objects.create(
+                user=user, specialization=specialization, clinic_address=address, license_number=username,
+                phone='9800000000', profile_picture='doctor_profiles/doctor.jpg',
+                certificate_picture='doctor_certificates/doctor.jpg',
+            )
+
+    def search(self, **params):
+        return [profile.user.username for profile in search_doctor_profiles(DoctorProfile.objects.select_related('user'), **params)]
+
+    def test_prefix_matching(self):
+        self.assertEqual(sorted(self.search(name='jo')), ['johanna_karki', 'john_smith'])
+        self.assertEqual(self.search(name='joh SM'), ['john_smith'])
+        self.assertEqual(self.search(specialization='derm'), ['johanna_karki'])
+        self.assertEqual(sorted(self.search(q='kath')), ['johanna_karki', 'ram_cardona'])
+        self.assertEqual(self.search(q='kathmandu thamel'), ['johanna_karki'])  # Every word must match
+        self.assertEqual(self.search(q='Káthmandú', name='ram'), ['ram_cardona'])  # Diacritics are ignored
+        self.assertEqual(self.search(name='pokhara'), [])  # Restricted to the name
+        self.assertEqual(self.search(q='zz'), [])
+        # Nothing to search for: everyone, by name
+        self.assertEqual(self.search(q='  -- '), ['johanna_karki', 'john_smith', 'ram_cardona', 'sita_rai'])
+
+    def test_ranked_matching(self):
+        # Name hit, then specialization hit, then address hit
+        self.assertEqual(self.search(q='card'), ['ram_cardona', 'john_smith', 'sita_rai'])
+
+    def test_profile_save_reindexes(self):
+        profile = self.profiles['john_smith']
+        profile.specialization = 'Orthopedist'
+        profile.save()
+        self.assertEqual(self.search(specialization='ortho'), ['john_smith'])
+        self.assertEqual(self.search(specialization='cardio'), [])
+
+    def test_username_change_reindexes(self):
+        user = self.profiles['john_smith'].user
+        user.username = 'jonas_thapa'
+        user.save(update_fields=['username'])
+        self.assertEqual(self.search(name='thapa'), ['jonas_thapa'])
+        self.assertEqual(self.search(name='smith'), [])
+
+        user.email = 'jonas@example.com'
+        user.username = 'jonas_shrestha'
+        user.save()
+        self.assertEqual(self.search(name='shre'), ['jonas_shrestha'])
+
+    def test_delete_unindexes(self):
+        self.profiles['john_smith'].delete()
+        self.assertEqual(self.search(name='jo'), ['johanna_karki'])
+        self.profiles['ram_cardona'].user.delete()  # Cascades to the profile
+        self.assertEqual(self.search(q='card'), ['sita_rai'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+
+class BatchPredictionTest(ModelFileMixin, SimpleTestCase):
+    """
+    /api/predict/batch/ validates its input, predicts every symptom set with one model call and
+    reports an unusable model as 503.
+    """
+
+    def setUp(self):
+        super().setUp()
+        for target, value in (('model_registry', self.registry), ('prediction_cache', PredictionCache(max_size=10, ttl=60))):
+            patcher = mock.patch(f'registration.disease_prediction.{target}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post(self, body):
+        return self.client.post('/api/predict/batch/', body if isinstance(body, str) else json.dumps(body), content_type='application/json')
+
+    def test_predicts_in_order(self):
+        self.deploy(15)
+        response = self.post({'symptom_sets': [['itching'], ['cough', 'high_fever'], ['itching'], []]})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['predictions'], [{'predicted_disease': 'Fungal infection', 'confidence': None}] * 4)
+        self.assertEqual(body['model']['version'], self.registry.get().version)
+        self.assertEqual(self.registry.get().model.batches, [3])  # Repeats are predicted once
+        self.assertEqual(predict_batch([], self.registry.get()), [])
+
+    @override_settings(PREDICTION_MAX_BATCH_SIZE=2)
+    def test_invalid_input(self):
+        self.deploy(15)
+        for body, error in [
+            ('{"symptom_sets": [', 'Invalid JSON body.'),
+            ([['itching']], "'symptom_sets' must be a list of symptom lists."),
+            ({'symptoms': ['itching']}, "'symptom_sets' must be a list of symptom lists."),
+            ({'symptom_sets': ['itching', 'cough']}, "'symptom_sets' must be a list of symptom lists."),
+            ({'symptom_sets': [['itching']] * 3}, "At most 2 symptom sets can be sent per request."),
+        ]:
+            with self.subTest(body=body):
+                response = self.post(body)
+                self.assertEqual((response.status_code, response.json()), (400, {'error': error}))
+        self.assertEqual(self.registry.get().model.batches, [])
+        self.assertEqual(self.client.get('/api/predict/batch/').status_code, 405)
+
+    def test_model_errors(self):
+        response = self.post({'symptom_sets': [['itching']]})  # Nothing deployed
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('could not be loaded', response.json()['error'])
+
+        self.deploy(15)
+        with mock.patch.object(FixedModel, 'predict', side_effect=ValueError('X has 3 features')):
+            response = self.post({'symptom_sets': [['itching']]})
+        self.assertEqual((response.status_code, response.json()), (400, {'error': 'X has 3 features'}))
+
+
+class ModelRegistryTest(ModelFileMixin, SimpleTestCase):
+    """
+    The registry swaps in a changed model file, keeps the previous model when the new one
+    cannot be loaded, and raises ModelUnavailable only when it has no model at all.
+    """
+
+    def test_hot_reload(self):
+        self.deploy(15)
+        first = self.registry.get()
+        self.assertEqual(first.model.disease, 15)
+        self.assertIs(self.registry.get(), first)  # Unchanged file: same snapshot
+
+        self.deploy(4)
+        second = self.registry.get()
+        self.assertEqual(second.model.disease, 4)
+        self.assertNotEqual(second.version, first.version)
+        self.assertEqual(second.info()['version'], second.version)
+
+        # Touched but identical: same model and version
+        mtime_ns = time.time_ns() + 100 * 10 ** 9
+        os.utime(self.path, ns=(mtime_ns, mtime_ns))
+        touched = self.registry.get()
+        self.assertIs(touched.model, second.model)
+        self.assertEqual((touched.version, touched.mtime_ns), (second.version, mtime_ns))
+
+    def test_check_interval(self):
+        registry = ModelRegistry(path=self.path, check_interval=60)
+        self.deploy(15)
+        first = registry.get()
+        self.deploy(4)
+        self.assertIs(registry.get(), first)  # Not looked at again yet
+
+    def test_broken_file_keeps_previous_model(self):
+        self.deploy(15)
+        first = self.registry.get()
+        self.path.write_bytes(b'half a pickle')
+        with self.assertLogs('registration.model_registry', 'ERROR'):
+            self.assertIs(self.registry.get(), first)
+        self.deploy(4)
+        self.assertEqual(self.registry.get().model.disease, 4)
+
+    def test_model_unavailable(self):
+        with self.assertRaisesMessage(ModelUnavailable, 'could not be loaded'):
+            self.registry.get()
+        self.path.write_bytes(b'not a model')
+        with self.assertRaises(ModelUnavailable):
+            self.registry.get()
+
+        with mock.patch('registration.disease_prediction.model_registry', self.registry), \
+                mock.patch('registration.disease_prediction.prediction_cache', PredictionCache(max_size=10, ttl=60)):
+            response = self.client.post('/api/predict/', json.dumps({'symptoms': ['itching']}), content_type='application/json')
+            self.assertEqual(response.status_code, 503)
+            self.deploy(4)
+            response = self.client.post('/api/predict/', json.dumps({'symptoms': ['itching']}), content_type='application/json')
+        self.assertEqual(response.json()['predicted_disease'], 'Allergy')
+
+
+@override_settings(APPOINTMENT_PAGE_SIZE=5, APPOINTMENT_MAX_PAGE_SIZE=8)
+class AppointmentPaginationTest(TestCase):
+    """
+    Appointment lists are keyset-paginated over (date, time, id): following the next
+    links visits every row once, in order, even with ties and rows added meanwhile.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user('page_patient', 'page_patient@example.com', 'password123', role='patient')
+        cls.doctors = [
+            User.objects.create_user(f'page_doctor_{i}', f'page_doctor_{i}@example.com', 'password123', role='doctor')
+            for i in range(2)
+        ]
+        # Both doctors see the patient at the same date and time: ties broken by id
+        Appointment.objects.bulk_create([
+            Appointment(
+                doctor=doctor, patient=cls.patient, date=datetime.date(2032, 3, day), time=slot, token=1,
+                status='confirmed' if day % 2 else 'pending',
+            )
+            for day in (1, 2, 3)
+            for slot in (datetime.time(9, 0), datetime.time(9, 15))
+            for doctor in cls.doctors
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            ids += [appointment['id'] for appointment in body['results']]
+            url, pages = body['next'], pages + 1
+        return ids, pages
+
+    def expected(self, *ordering, **filters):
+        return list(Appointment.objects.filter(**filters).order_by(*ordering).values_list('id', flat=True))
+
+    def test_cursor_round_trip(self):
+        appointment = Appointment.objects.order_by('id').last()
+        self.assertEqual(decode_cursor(encode_cursor(appointment)), (appointment.date, appointment.time, appointment.id))
+
+    def test_stable_order_across_pages(self):
+        self.assertEqual(
+            self.walk('/api/appointments/patient/'),
+            (self.expected('-date', '-time', '-id', patient=self.patient), 3),
+        )
+        self.client.force_authenticate(self.doctors[0])
+        self.assertEqual(
+            self.walk('/api/appointments/manage/'),
+            (self.expected('date', 'time', 'id', doctor=self.doctors[0]), 2),
+        )
+
+    def test_rows_added_meanwhile(self):
+        first = self.client.get('/api/appointments/patient/').json()
+        # Newer than the first page: the next pages neither shift nor repeat
+        Appointment.objects.create(doctor=self.doctors[0], patient=self.patient, date=datetime.date(2032, 4, 1), time=datetime.time(9, 0))
+        ids = [appointment['id'] for appointment in first['results']] + self.walk(first['next'])[0]
+        self.assertEqual(ids, self.expected('-date', '-time', '-id', patient=self.patient, date__lt=datetime.date(2032, 4, 1)))
+
+    def test_page_size(self):
+        for page_size, expected in (('3', 3), ('100', 8), ('0', 1)):
+            with self.subTest(page_size=page_size):
+                response = self.client.get('/api/appointments/patient/', {'page_size': page_size})
+                self.assertEqual(len(response.json()['results']), expected)
+        self.assertEqual(self.walk('/api/appointments/patient/?page_size=100')[1], 2)
+
+    def test_filters(self):
+        ids, _ = self.walk('/api/appointments/patient/?status=pending&page_size=1')
+        self.assertEqual(ids, self.expected('-date', '-time', '-id', status='pending'))
+        ids, _ = self.walk('/api/appointments/patient/?status=pending,confirmed&date_from=2032-03-02&date_to=2032-03-03')
+        self.assertEqual(ids, self.expected('-date', '-time', '-id', date__gte=datetime.date(2032, 3, 2)))
+        self.assertEqual(self.walk('/api/appointments/patient/?status=completed')[0], [])
+
+    def test_bad_parameters(self):
+        for params in (
+            {'cursor': 'not a cursor'},
+            {'cursor': base64.urlsafe_b64encode(b'2032-03-01|09:00').decode()},
+            {'cursor': base64.urlsafe_b64encode(b'2032-03-01|09:00|x').decode()},
+            {'cursor': base64.urlsafe_b64encode(b'\xff\xfe').decode()},
+            {'page_size': 'ten'},
+            {'status': 'pending,lost'},
+            {'date_from': '2032-13-01'},
+            {'date_to': 'tomorrow'},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get('/api/appointments/patient/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
@@ -4,7 +4,8 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
-from .disease_prediction import predict_disease
+from .disease_prediction import predict_disease, predict_disease_batch, PredictionCacheStatsView
+from .streams import notification_stream
 
 from .views import (
     UserRegistrationView, 
@@ -22,11 +23,17 @@ from .views import (
     DoctorUploadPrescriptionView,
     PatientRescheduleAppointmentView,
     NotificationListView,
+    UnreadNotificationCountView,
     MarkNotificationReadView,
+    BulkMarkNotificationsReadView,
     PatientAppointmentManagementView,
     DoctorAppointmentManagementView,
     DoctorProfileManagementView,
     DoctorProfilePublicView,
+    DoctorAvailabilityView,
+    AppointmentExportView,
+    AppointmentImportView,
+    DoctorProfileCacheStatsView,
     PasswordChangeView
 )
 
@@ -51,14 +58,23 @@ urlpatterns = [
     path('appointments/<int:appointment_id>/upload-prescription/', DoctorUploadPrescriptionView.as_view(), name='upload-prescription'),
     path('appointments/<int:appointment_id>/reschedule/', PatientRescheduleAppointmentView.as_view(), name='reschedule-appointment'),
     path('notifications/', NotificationListView.as_view(), name='notification-list'),
+    path('notifications/stream/', notification_stream, name='notification-stream'),
+    path('notifications/unread-count/', UnreadNotificationCountView.as_view(), name='notification-unread-count'),
+    path('notifications/read/', BulkMarkNotificationsReadView.as_view(), name='mark-notifications-read'),
     path('notifications/read/<int:notification_id>/', MarkNotificationReadView.as_view(), name='mark-notification-read'),
     path('appointments/patient/', PatientAppointmentManagementView.as_view(), name='patient-appointments'),
+    path('appointments/import/', AppointmentImportView.as_view(), name='appointment-import'),
+    path('appointments/export/', AppointmentExportView.as_view(), name='appointment-export'),
     path('appointments/doctor/', DoctorAppointmentManagementView.as_view(), name='doctor-appointments'),
     path('doctor/profile/', DoctorProfileManagementView.as_view(), name='doctor-profile'),
     path('doctors/', DoctorProfilePublicView.as_view(), name='doctor-list'),
+    path('doctors/cache-stats/', DoctorProfileCacheStatsView.as_view(), name='doctor-cache-stats'),
     path('doctors/<int:doctor_id>/', DoctorProfilePublicView.as_view(), name='doctor-detail'),
+    path('doctors/<int:doctor_id>/availability/', DoctorAvailabilityView.as_view(), name='doctor-availability'),
     path('password-change/', PasswordChangeView.as_view(), name='password-change'),
     path('predict/', predict_disease, name='predict_disease'),
+    path('predict/batch/', predict_disease_batch, name='predict_disease_batch'),
+    path('predict/cache-stats/', PredictionCacheStatsView.as_view(), name='prediction_cache_stats'),
     
 
 
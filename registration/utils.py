@@ -1,29 +1,31 @@
-
-from .models import Notification
-
-from django.core.mail import send_mail
-from .models import Notification
+from django.db import transaction
+from .models import Notification, EmailOutbox
+from .instrumentation import timed_section
 
 def send_email_and_notification(recipient, subject, message, event_type):
     """
-    Send an email to the recipient and create an in-app notification.
+    Create an in-app notification and queue an email for the recipient.
+
+    The email is written to the outbox in the same transaction as the
+    notification and delivered later by `manage.py send_outbox`, so the
+    request never waits on the SMTP server.
     """
-    # Send email
-    if recipient.email:
-        send_mail(
+    with timed_section('email'), transaction.atomic():
+        # Create an in-app notification
+        notification = Notification.objects.create(
+            recipient=recipient,
+            event_type=event_type,
             subject=subject,
-            message=message,
-            from_email='programmersaphal@gmail.com',
-            recipient_list=[recipient.email],
-            fail_silently=False,
+            message=message
         )
 
-    # Create an in-app notification
-    notification = Notification.objects.create(
-        recipient=recipient,
-        event_type=event_type,
-        subject=subject,
-        message=message
-    )
+        # Queue the email
+        if recipient.email:
+            EmailOutbox.objects.create(
+                notification=notification,
+                recipient_email=recipient.email,
+                subject=subject,
+                message=message,
+            )
 
     return notification
@@ -10,6 +10,19 @@ from rest_framework.generics import ListAPIView
 from rest_framework.filters import SearchFilter
 from registration.models import User, Appointment, Notification, DoctorProfile
 from .utils import send_email_and_notification
+from .pagination import paginate_appointments, filter_appointments, PaginationError
+from .search import search_doctor_profiles
+from .availability import free_slots, parse_range, AvailabilityError
+from . import profile_cache
+from .authentication import invalidate_user
+from .instrumentation import timed_section
+from .retry import retry_on_lock
+from .idempotency import idempotent
+from .exports import CONTENT_TYPES, stream_export
+from .imports import FORMATS, format_for, import_appointments
+import codecs
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.utils.http import urlsafe_base64_encode  
 from django.utils.encoding import force_bytes
@@ -19,6 +32,10 @@ from django.core.exceptions import ObjectDoesNotExist
 import json
 from django.conf import settings 
 from django.contrib.auth.models import update_last_login
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils.http import parse_etags, quote_etag
+from django.utils.dateparse import parse_datetime
 # Create your views here.
 
 class UserRegistrationView(APIView):
@@ -112,7 +129,7 @@ class ProtectedView(APIView):
     def get(self, request):
         return Response({"message": "You are authenticated!"})
     
-from rest_framework_simplejwt.tokens import RefreshToken
+from .blacklist import FilteredRefreshToken
 
 class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
@@ -120,8 +137,9 @@ class LogoutView(APIView):
     def post(self, request):
         try:
             refresh_token = request.data.get('refresh_token')
-            token = RefreshToken(refresh_token)
+            token = FilteredRefreshToken(refresh_token)
             token.blacklist()
+            invalidate_user(request.user.pk)
             return Response({"message": "Successfully logged out."}, status=200)
         except Exception as e:
             return Response({"error": "Invalid token."}, status=400)
@@ -197,6 +215,8 @@ class PasswordResetConfirmView(APIView):
 class AppointmentBookingView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @retry_on_lock
+    @idempotent
     def post(self, request):
         if request.user.role != 'patient':
             return Response({"error": "Only patients can book appointments."}, status=status.HTTP_403_FORBIDDEN)
@@ -204,7 +224,7 @@ class AppointmentBookingView(APIView):
         serializer = AppointmentSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
-            appointment=Appointment.objects.get(id=serializer.data.get('id'))
+            appointment = serializer.instance  # Doctor and patient are already loaded
             # print(serializer.data)
 
             from .utils import send_email_and_notification
@@ -226,15 +246,23 @@ class DoctorManageAppointmentsView(APIView):
             return Response({"error": "Only doctors can manage appointments."}, status=status.HTTP_403_FORBIDDEN)
 
         appointments = Appointment.objects.filter(doctor=request.user)
-        serializer = AppointmentSerializer(appointments, many=True)
-        return Response(serializer.data)
+        try:
+            page, next_url = paginate_appointments(request, appointments, descending=False)
+        except PaginationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        with timed_section('serialize'):
+            results = AppointmentSerializer(page, many=True).data
+        return Response({"next": next_url, "results": results})
 
+    @retry_on_lock
+    @idempotent
     def patch(self, request, appointment_id):
         if request.user.role != 'doctor':
             return Response({"error": "Only doctors can manage appointments."}, status=status.HTTP_403_FORBIDDEN)
 
         try:
-            appointment = Appointment.objects.get(id=appointment_id, doctor=request.user)
+            appointment = Appointment.objects.select_related('doctor', 'patient').get(id=appointment_id, doctor=request.user)
         except Appointment.DoesNotExist:
             return Response({"error": "Appointment not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -307,12 +335,16 @@ class PatientCompleteAppointmentView(APIView):
         serializer = AppointmentSerializer(appointment)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @retry_on_lock
+    @idempotent
     def patch(self, request, appointment_id):
         if request.user.role != 'patient':
             return Response({"error": "Only patients can complete appointments."}, status=status.HTTP_403_FORBIDDEN)
 
         try:
-            appointment = Appointment.objects.get(id=appointment_id, patient=request.user, status='confirmed')
+            appointment = Appointment.objects.select_related('doctor', 'patient').get(
+                id=appointment_id, patient=request.user, status='confirmed'
+            )
         except Appointment.DoesNotExist:
             return Response({"error": "Appointment not found or not confirmed."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -322,7 +354,7 @@ class PatientCompleteAppointmentView(APIView):
         from .utils import send_email_and_notification
         send_email_and_notification(
             recipient=appointment.doctor,
-            event_type="Appointment_completed",
+            event_type="appointment_completed",
             subject="Appointment Completed",
             message=f"The appointment with {appointment.patient.username} on {appointment.date} at {appointment.time} has been marked as completed."
         )
@@ -330,6 +362,8 @@ class PatientCompleteAppointmentView(APIView):
 
 class DoctorUploadPrescriptionView(APIView):
     permission_classes = [IsAuthenticated]
+    @retry_on_lock
+    @idempotent
     def patch(self, request, appointment_id):
         """
         Allows a doctor to upload a prescription for a completed appointment.
@@ -339,7 +373,9 @@ class DoctorUploadPrescriptionView(APIView):
 
         try:
             # Ensure the appointment exists and is marked as 'completed'
-            appointment = Appointment.objects.get(id=appointment_id, doctor=request.user, status='completed')
+            appointment = Appointment.objects.select_related('doctor', 'patient').get(
+                id=appointment_id, doctor=request.user, status='completed'
+            )
         except Appointment.DoesNotExist:
             return Response(
                 {"error": "Appointment not found or not marked as completed."},
@@ -374,6 +410,8 @@ class DoctorUploadPrescriptionView(APIView):
 class PatientRescheduleAppointmentView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @retry_on_lock
+    @idempotent
     def patch(self, request, appointment_id):
         """
         Allows patients to reschedule an appointment with status pending, confirmed, or canceled.
@@ -383,9 +421,9 @@ class PatientRescheduleAppointmentView(APIView):
 
         try:
             # Retrieve the appointment
-            appointment = Appointment.objects.get(
-                id=appointment_id, 
-                patient=request.user, 
+            appointment = Appointment.objects.select_related('doctor', 'patient').get(
+                id=appointment_id,
+                patient=request.user,
                 status__in=['pending', 'confirmed', 'canceled']
             )
         except Appointment.DoesNotExist:
@@ -445,50 +483,133 @@ class PatientRescheduleAppointmentView(APIView):
             status=status.HTTP_200_OK
         )
 
+def inbox_state(user):
+    """
+    Size, newest id and unread count of a user's inbox, in one query.
+    """
+    return Notification.objects.filter(recipient=user).aggregate(
+        total=Count('id'),
+        latest_id=Max('id'),
+        unread=Count('id', filter=Q(is_read=False)),
+    )
+
+
 class NotificationListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        notifications = Notification.objects.filter(recipient=request.user).order_by('-created_at')
-        notification_data = [
-            {
-                "id": notification.id,
-                "event_type": notification.event_type,
-                "subject": notification.subject,
-                "message": notification.message,
-                "is_read": notification.is_read,
-                "created_at": notification.created_at
-            }
-            for notification in notifications
-        ]
-        return Response(notification_data, status=status.HTTP_200_OK)
+        """
+        List the user's notifications, newest first.
+
+        `since=<id>` returns only notifications newer than that id. The
+        response carries an ETag; polling with `If-None-Match` gets a 304
+        without the list being loaded while the inbox is unchanged.
+        """
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return Response({"error": "'since' must be a notification id."}, status=status.HTTP_400_BAD_REQUEST)
+
+        state = inbox_state(request.user)
+        etag = quote_etag(f"{state['total']}-{state['latest_id'] or 0}-{state['unread']}-{since or 0}")
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        notifications = Notification.objects.filter(recipient=request.user)
+        if since is not None:
+            notifications = notifications.filter(id__gt=since)
+        notification_data = list(
+            notifications.order_by('-created_at').values(
+                'id', 'event_type', 'subject', 'message', 'is_read', 'created_at'
+            )
+        )
+        return Response(notification_data, status=status.HTTP_200_OK, headers={'ETag': etag})
+
+
+class UnreadNotificationCountView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        unread = Notification.objects.filter(recipient=request.user, is_read=False).count()
+        return Response({"unread_count": unread}, status=status.HTTP_200_OK)
 
 class MarkNotificationReadView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @retry_on_lock
     def patch(self, request, notification_id):
-        try:
-            notification = Notification.objects.get(id=notification_id, recipient=request.user)
-            notification.is_read = True
-            notification.save()
-            return Response({"message": "Notification marked as read."}, status=status.HTTP_200_OK)
-        except Notification.DoesNotExist:
+        updated = Notification.objects.filter(id=notification_id, recipient=request.user).update(is_read=True)
+        if not updated:
             return Response({"error": "Notification not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"message": "Notification marked as read."}, status=status.HTTP_200_OK)
+
+
+class BulkMarkNotificationsReadView(APIView):
+    permission_classes = [IsAuthenticated]
+    max_ids = 1000
+
+    @retry_on_lock
+    def patch(self, request):
+        """
+        Mark many notifications as read with a single UPDATE.
+
+        Send one of `ids` (a list), `up_to_id` (everything with an id up to
+        and including it), `before` (everything created before an ISO
+        timestamp) or `all: true`.
+        """
+        notifications = Notification.objects.filter(recipient=request.user, is_read=False)
+        ids = request.data.get('ids')
+        up_to_id = request.data.get('up_to_id')
+        before = request.data.get('before')
+
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+                return Response({"error": "'ids' must be a list of notification ids."}, status=status.HTTP_400_BAD_REQUEST)
+            if len(ids) > self.max_ids:
+                return Response({"error": f"At most {self.max_ids} ids can be sent at once."}, status=status.HTTP_400_BAD_REQUEST)
+            notifications = notifications.filter(id__in=ids)
+        elif up_to_id is not None:
+            if not isinstance(up_to_id, int):
+                return Response({"error": "'up_to_id' must be a notification id."}, status=status.HTTP_400_BAD_REQUEST)
+            notifications = notifications.filter(id__lte=up_to_id)
+        elif before is not None:
+            before = parse_datetime(before) if isinstance(before, str) else None
+            if before is None:
+                return Response({"error": "'before' must be an ISO 8601 timestamp."}, status=status.HTTP_400_BAD_REQUEST)
+            notifications = notifications.filter(created_at__lt=before)
+        elif request.data.get('all') is not True:
+            return Response(
+                {"error": "Send 'ids', 'up_to_id', 'before' or 'all'."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        updated = notifications.update(is_read=True)
+        unread = Notification.objects.filter(recipient=request.user, is_read=False).count()
+        return Response({"updated": updated, "unread_count": unread}, status=status.HTTP_200_OK)
 
 class PatientAppointmentManagementView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         """
-        Retrieve all appointments for the logged-in patient.
+        Retrieve the logged-in patient's appointments, newest first, one page at a time.
         """
         if request.user.role != 'patient':
             return Response({"error": "Only patients can view their appointments."}, status=status.HTTP_403_FORBIDDEN)
 
-        appointments = Appointment.objects.filter(patient=request.user).order_by('-date', '-time')
-        serializer = AppointmentSerializer(appointments, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        appointments = Appointment.objects.filter(patient=request.user)
+        try:
+            page, next_url = paginate_appointments(request, appointments)
+        except PaginationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        with timed_section('serialize'):
+            results = AppointmentSerializer(page, many=True).data
+        return Response({"next": next_url, "results": results}, status=status.HTTP_200_OK)
 
+    @retry_on_lock
+    @idempotent
     def patch(self, request, appointment_id):
         """
         Allows the patient to mark a 'confirmed' appointment as 'completed'.
@@ -521,14 +642,89 @@ class DoctorAppointmentManagementView(APIView):
 
     def get(self, request):
         """
-        Retrieve all appointments for the logged-in doctor.
+        Retrieve the logged-in doctor's appointments, newest first, one page at a time.
         """
         if request.user.role != 'doctor':
             return Response({"error": "Only doctors can view their appointments."}, status=status.HTTP_403_FORBIDDEN)
 
-        appointments = Appointment.objects.filter(doctor=request.user).order_by('-date', '-time')
-        serializer = AppointmentSerializer(appointments, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        appointments = Appointment.objects.filter(doctor=request.user)
+        try:
+            page, next_url = paginate_appointments(request, appointments)
+        except PaginationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        with timed_section('serialize'):
+            results = AppointmentSerializer(page, many=True).data
+        return Response({"next": next_url, "results": results}, status=status.HTTP_200_OK)
+
+
+class AppointmentExportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Stream appointments as CSV (`output=csv`, the default) or NDJSON (`output=ndjson`).
+
+        Doctors export their own appointments, admins every appointment or
+        one doctor's with `doctor=<id>`. Filters: `status`, `date_from`, `date_to`.
+        """
+        user = request.user
+        if user.role == 'doctor':
+            # (doctor, date, time) is unique, so its index also yields the order
+            appointments = Appointment.objects.filter(doctor=user).order_by('date', 'time')
+        elif user.role == 'admin' or user.is_staff:
+            appointments = Appointment.objects.order_by('id')
+            doctor_id = request.query_params.get('doctor')
+            if doctor_id:
+                if not doctor_id.isdigit():
+                    return Response({"error": "'doctor' must be a user id."}, status=status.HTTP_400_BAD_REQUEST)
+                appointments = Appointment.objects.filter(doctor_id=doctor_id).order_by('date', 'time')
+        else:
+            return Response({"error": "Only doctors and admins can export appointments."}, status=status.HTTP_403_FORBIDDEN)
+
+        output = request.query_params.get('output', 'csv')
+        if output not in CONTENT_TYPES:
+            return Response({"error": f"'output' must be one of {sorted(CONTENT_TYPES)}."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            appointments = filter_appointments(appointments, request.query_params)
+        except PaginationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(stream_export(appointments, output), content_type=CONTENT_TYPES[output])
+        filename = f"appointments-{timezone.localdate().isoformat()}.{output}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class AppointmentImportView(APIView):
+    permission_classes = [IsAuthenticated]
+    max_rejections = 1000
+
+    def post(self, request):
+        """
+        Import appointments from an uploaded CSV or NDJSON `file` (admins only).
+
+        Columns: doctor, patient (usernames), date, time and optionally
+        status, reason and prescription. Rows that cannot be imported are
+        reported back with their line number and reason.
+        """
+        if request.user.role != 'admin' and not request.user.is_staff:
+            return Response({"error": "Only admins can import appointments."}, status=status.HTTP_403_FORBIDDEN)
+
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload the appointments as 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or format_for(upload.name)
+        if file_format not in FORMATS:
+            return Response({"error": f"The file must be one of {list(FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # All or nothing if the upload turns out to be unreadable halfway through
+            with transaction.atomic():
+                result = import_appointments(codecs.iterdecode(upload, 'utf-8-sig'), file_format)
+        except UnicodeDecodeError:
+            return Response({"error": "The file must be UTF-8 encoded."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result.as_dict(self.max_rejections), status=status.HTTP_200_OK)
 
 
 class DoctorProfilePublicView(APIView):
@@ -537,30 +733,73 @@ class DoctorProfilePublicView(APIView):
     def get(self, request, doctor_id=None):
         """
         Retrieve all doctor profiles or a specific doctor profile.
+
+        Searching with `q` (any field), `name` or `specialization` matches
+        word prefixes and returns the best matches first. Responses are
+        served from the profile cache and carry an ETag; `If-None-Match`
+        gets a 304.
         """
         if doctor_id:
             # Fetch a specific doctor's profile
-            try:
-                profile = DoctorProfile.objects.get(user_id=doctor_id)
-                serializer = PublicDoctorProfileSerializer(profile)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            except DoctorProfile.DoesNotExist:
+            def build():
+                profile = DoctorProfile.objects.select_related('user').filter(user_id=doctor_id).first()
+                return PublicDoctorProfileSerializer(profile).data if profile else None
+
+            entry = profile_cache.get_profile(doctor_id, build)
+            if entry is None:
                 return Response({"error": "Doctor profile not found."}, status=status.HTTP_404_NOT_FOUND)
         else:
+            query = request.query_params.get('q', '').strip()
             name = request.query_params.get('name', '').strip().lower()
             specialization = request.query_params.get('specialization', '').strip().lower()
-            
-            # Fetch all doctor profiles
-            profiles = DoctorProfile.objects.all()
 
-            if name:
-                profiles = profiles.filter(user__username__icontains=name)
+            # Fetch all doctor profiles, or the best matches when searching
+            def build():
+                profiles = search_doctor_profiles(
+                    DoctorProfile.objects.select_related('user'), q=query, name=name, specialization=specialization
+                )
+                with timed_section('serialize'):
+                    return PublicDoctorProfileSerializer(profiles, many=True).data
 
-            if specialization:
-                profiles = profiles.filter(specialization__icontains=specialization)
-            
-            serializer = PublicDoctorProfileSerializer(profiles, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            entry = profile_cache.get_directory({'q': query, 'name': name, 'specialization': specialization}, build)
+
+        etag, data = entry
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(data, status=status.HTTP_200_OK, headers={'ETag': etag})
+
+
+class DoctorProfileCacheStatsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """
+        Hit/miss counters and hit ratios of this process's doctor profile cache.
+        """
+        return Response(profile_cache.stats.snapshot(), status=status.HTTP_200_OK)
+
+class DoctorAvailabilityView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, doctor_id):
+        """
+        Free slots of a doctor between `start` and `end` (inclusive, default a week from today).
+        """
+        try:
+            start, end = parse_range(request.query_params)
+        except AvailabilityError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            profile = DoctorProfile.objects.only('user_id', 'work_start', 'work_end', 'slot_minutes').get(user_id=doctor_id)
+        except DoctorProfile.DoesNotExist:
+            return Response({"error": "Doctor profile not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            "doctor": doctor_id,
+            "slot_minutes": profile.slot_minutes,
+            "days": free_slots(profile, start, end),
+        }, status=status.HTTP_200_OK)
 
 class PasswordChangeView(APIView):
     permission_classes = [IsAuthenticated]
@@ -569,7 +808,8 @@ class PasswordChangeView(APIView):
         """
         Allows the authenticated user to change their password.
         """
-        user = request.user
+        # request.user only carries the token claims
+        user = User.objects.get(pk=request.user.pk)
         current_password = request.data.get('current_password')
         new_password = request.data.get('new_password')
 